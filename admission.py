@@ -0,0 +1,289 @@
+# 과부하 시 부하 차단(load shedding) 미들웨어
+# 이벤트 루프 지연, 처리 중인 요청/업스트림 호출 수, 대기 시간을 보고
+# 우선순위가 낮은 요청(/users/, /chat/history, 로그인)부터 503으로 거절하고 채팅은 마지막까지 유지합니다
+# 동시 처리 한도는 AIMD(가산 증가/승산 감소) 방식으로 자동 조절됩니다
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# 우선순위 (숫자가 클수록 중요)
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+PRIORITY_NAMES = {PRIORITY_LOW: "low", PRIORITY_NORMAL: "normal", PRIORITY_HIGH: "high"}
+
+# 경로별 우선순위 ((메서드, 경로) -> 우선순위), 없으면 PRIORITY_NORMAL
+ROUTE_PRIORITIES = {
+    ("POST", "/chat/conversation"): PRIORITY_HIGH,
+    ("POST", "/chat/role"): PRIORITY_HIGH,
+    ("GET", "/users/"): PRIORITY_LOW,
+    ("GET", "/chat/history"): PRIORITY_LOW,
+    ("POST", "/user/login"): PRIORITY_LOW,
+}
+
+# 차단하지 않는 경로 (상태 확인) 및 경로 접두사 (서버 지표 조회)
+EXEMPT_PATHS = {"/"}
+EXEMPT_PREFIXES = ("/server/",)
+
+# 우선순위별로 사용할 수 있는 동시 처리 한도 비율
+LIMIT_SHARE = {PRIORITY_LOW: 0.5, PRIORITY_NORMAL: 0.8, PRIORITY_HIGH: 1.0}
+
+INITIAL_LIMIT = int(os.environ.get("ADMISSION_INITIAL_LIMIT", "32"))
+MIN_LIMIT = int(os.environ.get("ADMISSION_MIN_LIMIT", "4"))
+MAX_LIMIT = int(os.environ.get("ADMISSION_MAX_LIMIT", "256"))
+# 이벤트 루프 지연 기준 (초)
+LAG_THRESHOLD = float(os.environ.get("ADMISSION_LAG_THRESHOLD", "0.1"))
+# 채팅 요청이 빈 자리를 기다릴 수 있는 최대 시간 (초)
+MAX_QUEUE_WAIT = float(os.environ.get("ADMISSION_MAX_QUEUE_WAIT", "5.0"))
+# 동시에 진행할 수 있는 업스트림 호출 수 (넘으면 채팅 외 요청 차단)
+UPSTREAM_LIMIT = int(os.environ.get("ADMISSION_UPSTREAM_LIMIT", "64"))
+
+
+class AdmissionController:
+    """동시 처리 한도 계산과 요청 허용/거절 판단"""
+
+    def __init__(
+        self,
+        initial_limit: int = INITIAL_LIMIT,
+        min_limit: int = MIN_LIMIT,
+        max_limit: int = MAX_LIMIT,
+        lag_threshold: float = LAG_THRESHOLD,
+        max_queue_wait: float = MAX_QUEUE_WAIT,
+        upstream_limit: int = UPSTREAM_LIMIT,
+        lag_interval: float = 0.05,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.lag_threshold = lag_threshold
+        self.max_queue_wait = max_queue_wait
+        self.upstream_limit = upstream_limit
+        self.lag_interval = lag_interval
+
+        self.in_flight = 0
+        self.upstream_in_flight = 0
+        self.loop_lag = 0.0
+        # 경로마다 정상 지연이 크게 다르므로 우선순위별로 따로 기록
+        self.avg_latency: Dict[int, float] = {}
+        self.long_latency: Dict[int, float] = {}
+        self.max_queue_wait_seen = 0.0
+
+        # 빈 자리를 기다리는 채팅 요청 수
+        self.waiting = 0
+        self._last_decrease = 0.0
+
+        self.admitted: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+
+        # 이벤트 루프에 묶이는 객체는 처음 사용하는 루프에서 생성
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._cond: Optional[asyncio.Condition] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def _ensure_lag_monitor(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self._lag_task = None
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = loop.create_task(self._monitor_lag())
+
+    async def close(self):
+        """이벤트 루프 지연 측정 작업 중지"""
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _monitor_lag(self):
+        """sleep이 예정보다 얼마나 늦게 깨어나는지로 이벤트 루프 지연 측정"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - start - self.lag_interval)
+            # 급격한 변화를 줄이기 위해 지수 이동 평균 사용
+            self.loop_lag = self.loop_lag * 0.7 + lag * 0.3
+
+    def _can_admit(self, priority: int) -> bool:
+        # 채팅은 업스트림 응답을 기다리는 요청까지 포함해 동시 처리 수를 제한하고,
+        # 나머지는 서버에서 실제로 처리 중인 요청만 셈
+        # (업스트림만 느린 상황에서 읽기 요청까지 거절하지 않도록, 업스트림 포화는 아래에서 따로 확인)
+        active = self.in_flight
+        if priority < PRIORITY_HIGH:
+            active -= self.upstream_in_flight
+        if active >= self.limit * LIMIT_SHARE[priority]:
+            return False
+        if priority < PRIORITY_HIGH:
+            # 채팅이 아닌 요청은 루프 지연이나 업스트림 포화 시 먼저 거절
+            lag_limit = self.lag_threshold * (1 if priority == PRIORITY_LOW else 2)
+            if self.loop_lag > lag_limit:
+                return False
+            if self.upstream_in_flight >= self.upstream_limit:
+                return False
+        return True
+
+    async def acquire(self, priority: int) -> bool:
+        """요청 허용 여부 결정 (채팅만 빈 자리를 잠시 기다림)"""
+        self._ensure_lag_monitor()
+        name = PRIORITY_NAMES[priority]
+
+        # 이미 기다리는 채팅 요청이 있으면 새 요청이 앞질러 들어가지 않음
+        if self.waiting == 0 and self._can_admit(priority):
+            self.in_flight += 1
+            self.admitted[name] += 1
+            return True
+
+        if priority < PRIORITY_HIGH or self.max_queue_wait <= 0:
+            self.shed[name] += 1
+            return False
+
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            async with self._cond:
+                await asyncio.wait_for(
+                    self._cond.wait_for(lambda: self._can_admit(priority)),
+                    timeout=self.max_queue_wait,
+                )
+                self.in_flight += 1
+        except asyncio.TimeoutError:
+            self.shed[name] += 1
+            self._decrease(priority)
+            return False
+        finally:
+            self.waiting -= 1
+            waited = time.perf_counter() - start
+            self.max_queue_wait_seen = max(self.max_queue_wait_seen, waited)
+
+        self.admitted[name] += 1
+        # 대기가 길었다면 과부하 신호로 보고 한도를 줄임
+        if waited > self.max_queue_wait / 2:
+            self._decrease(priority)
+        return True
+
+    async def release(self, priority: int, latency: float, failed: bool):
+        """요청 완료 후 한도 조절 및 대기 중인 요청 깨우기"""
+        self.in_flight -= 1
+        self._observe(priority, latency, failed)
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _observe(self, priority: int, latency: float, failed: bool):
+        # 단기/장기 지수 이동 평균
+        avg_latency = self.avg_latency.get(priority, latency) * 0.9 + latency * 0.1
+        long_latency = self.long_latency.get(priority, latency) * 0.99 + latency * 0.01
+        self.avg_latency[priority] = avg_latency
+        self.long_latency[priority] = long_latency
+
+        # 지연 기울기: 단기 평균이 장기 평균의 두 배를 넘으면 혼잡으로 판단
+        congested = (
+            failed
+            or self.loop_lag > self.lag_threshold
+            or avg_latency > long_latency * 2
+        )
+        if congested:
+            self._decrease(priority)
+        elif self.in_flight >= self.limit * 0.5:
+            # 한도를 실제로 사용하고 있을 때만 증가
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self, priority: int):
+        # 한 번의 혼잡에 동시에 끝난 요청들이 모두 한도를 줄이지 않도록
+        # 평균 지연시간(최소 lag_interval)마다 한 번만 감소
+        now = time.perf_counter()
+        window = max(self.lag_interval, self.avg_latency.get(priority, 0.0))
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * 0.9)
+
+    @asynccontextmanager
+    async def track_upstream(self):
+        """업스트림 API 호출 수 추적"""
+        self.upstream_in_flight += 1
+        try:
+            yield
+        finally:
+            self.upstream_in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "upstream_in_flight": self.upstream_in_flight,
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "avg_latency_ms": {
+                PRIORITY_NAMES[p]: round(v * 1000, 2)
+                for p, v in self.avg_latency.items()
+            },
+            "max_queue_wait_ms": round(self.max_queue_wait_seen * 1000, 2),
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+        }
+
+
+class LoadSheddingMiddleware:
+    """AdmissionController로 요청을 거르는 ASGI 미들웨어"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"] in EXEMPT_PATHS
+            or scope["path"].startswith(EXEMPT_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        priority = ROUTE_PRIORITIES.get(
+            (scope["method"], scope["path"]), PRIORITY_NORMAL
+        )
+        if not await self.controller.acquire(priority):
+            await self._reject(send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 업스트림 타임아웃(408)과 서버 오류만 혼잡 신호로 취급
+            failed = status["code"] == 408 or status["code"] >= 500
+            await self.controller.release(
+                priority, time.perf_counter() - start, failed
+            )
+
+    async def _reject(self, send):
+        body = json.dumps(
+            {"detail": "서버가 혼잡합니다. 잠시 후 다시 시도해주세요"}, ensure_ascii=False
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
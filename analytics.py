@@ -0,0 +1,363 @@
+# 사용량 분석 모듈
+# 채팅 요청마다 사용자/역할별 요청 수, 오류 수, 지연시간, 토큰 사용량을 시간 단위 버킷에 누적합니다
+# 버킷은 고정 크기 링 버퍼라 메모리 사용량이 일정하며, 주기적으로 SQLite 집계 테이블에 저장됩니다
+# /analytics 조회는 원본 이벤트가 아니라 이 집계값만 사용합니다
+import asyncio
+import datetime
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+ANALYTICS_DB_PATH = os.environ.get("ANALYTICS_DB_PATH", "analytics.db")
+# 버킷 하나의 길이 (초)와 메모리에 유지할 버킷 수 (기본 1시간 x 48개)
+BUCKET_SECONDS = int(os.environ.get("ANALYTICS_BUCKET_SECONDS", "3600"))
+NUM_BUCKETS = int(os.environ.get("ANALYTICS_NUM_BUCKETS", "48"))
+# 집계 테이블 저장 주기 (초)
+ROLLUP_INTERVAL = float(os.environ.get("ANALYTICS_ROLLUP_INTERVAL", "60"))
+# 버킷 하나에 기록할 최대 사용자/역할 수 (넘으면 OTHER_KEY로 합산)
+MAX_KEYS_PER_BUCKET = 1000
+OTHER_KEY = "__other__"
+
+DIMENSIONS = ("user", "role")
+COUNTER_FIELDS = (
+    "requests",
+    "errors",
+    "latency_sum_ms",
+    "latency_max_ms",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_rollup (
+    bucket_start INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    latency_sum_ms REAL NOT NULL,
+    latency_max_ms REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    PRIMARY KEY (bucket_start, dimension, key)
+)
+"""
+
+# 마지막 저장 이후 늘어난 값(증분)만 더함
+# 여러 워커가 같은 DB를 써도 서로의 값을 덮어쓰지 않음
+_UPSERT = """
+INSERT INTO usage_rollup
+    (bucket_start, dimension, key, requests, errors, latency_sum_ms,
+     latency_max_ms, prompt_tokens, completion_tokens, total_tokens)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (bucket_start, dimension, key) DO UPDATE SET
+    requests = requests + excluded.requests,
+    errors = errors + excluded.errors,
+    latency_sum_ms = latency_sum_ms + excluded.latency_sum_ms,
+    latency_max_ms = MAX(latency_max_ms, excluded.latency_max_ms),
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    total_tokens = total_tokens + excluded.total_tokens
+"""
+
+
+def _new_counter() -> Dict:
+    return dict.fromkeys(COUNTER_FIELDS, 0)
+
+
+def _merge(target: Dict, source: Dict):
+    for field in COUNTER_FIELDS:
+        if field == "latency_max_ms":
+            target[field] = max(target[field], source[field])
+        else:
+            target[field] += source[field]
+
+
+class Bucket:
+    """한 시간 구간의 사용자별/역할별 카운터"""
+
+    __slots__ = ("start", "counters", "pending")
+
+    def __init__(self, start: int):
+        self.start = start
+        # 조회용 합계와 마지막 저장 이후의 증분
+        self.counters: Dict[str, Dict[str, Dict]] = {dim: {} for dim in DIMENSIONS}
+        self.pending: Dict[str, Dict[str, Dict]] = {dim: {} for dim in DIMENSIONS}
+
+    @property
+    def dirty(self) -> bool:
+        return any(self.pending.values())
+
+    def add(self, dimension: str, key: str, event: Dict):
+        counters = self.counters[dimension]
+        if key not in counters and len(counters) >= MAX_KEYS_PER_BUCKET:
+            key = OTHER_KEY
+        for target in (counters, self.pending[dimension]):
+            counter = target.get(key)
+            if counter is None:
+                counter = target[key] = _new_counter()
+            _merge(counter, event)
+
+    def take_pending(self) -> Dict[str, Dict[str, Dict]]:
+        """저장할 증분을 꺼내고 비움"""
+        pending = self.pending
+        self.pending = {dim: {} for dim in DIMENSIONS}
+        return pending
+
+    def restore_pending(self, pending: Dict[str, Dict[str, Dict]]):
+        """저장에 실패한 증분을 되돌림"""
+        for dimension, counters in pending.items():
+            target = self.pending[dimension]
+            for key, c in counters.items():
+                _merge(target.setdefault(key, _new_counter()), c)
+
+
+class UsageAnalytics:
+    """시간 버킷 링 버퍼 기반 사용량 집계"""
+
+    def __init__(
+        self,
+        db_path: str = ANALYTICS_DB_PATH,
+        bucket_seconds: int = BUCKET_SECONDS,
+        num_buckets: int = NUM_BUCKETS,
+        rollup_interval: float = ROLLUP_INTERVAL,
+    ):
+        self.db_path = db_path
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.rollup_interval = rollup_interval
+
+        self._buckets: List[Optional[Bucket]] = [None] * num_buckets
+        # 링에서 밀려났지만 아직 저장하지 않은 증분이 남은 버킷
+        self._retired: List[Bucket] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_rollup_ms = 0.0
+
+    def _bucket_start(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds) * self.bucket_seconds
+
+    def _index(self, start: int) -> int:
+        return (start // self.bucket_seconds) % self.num_buckets
+
+    def _bucket_for(self, timestamp: float) -> Bucket:
+        start = self._bucket_start(timestamp)
+        index = self._index(start)
+        bucket = self._buckets[index]
+        if bucket is None or bucket.start != start:
+            # 가장 오래된 버킷 자리를 재사용 (남은 증분은 다음 저장 때 기록)
+            if bucket is not None and bucket.dirty:
+                self._retired.append(bucket)
+            bucket = self._buckets[index] = Bucket(start)
+        return bucket
+
+    def start(self):
+        """집계 테이블 준비 및 주기적 저장 작업 시작"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+            self._load_recent()
+        loop = asyncio.get_running_loop()
+        # 이전 이벤트 루프에서 만든 작업이면 현재 루프에서 다시 시작
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._run())
+
+    def _load_recent(self):
+        """재시작 시 링 버퍼 범위의 집계값을 조회용 합계로 복원 (증분은 비어 있음)"""
+        now_start = self._bucket_start(time.time())
+        since = now_start - (self.num_buckets - 1) * self.bucket_seconds
+        cursor = self._conn.execute(
+            "SELECT bucket_start, dimension, key, "
+            + ", ".join(COUNTER_FIELDS)
+            + " FROM usage_rollup WHERE bucket_start >= ?",
+            (since,),
+        )
+        for row in cursor:
+            bucket_start, dimension, key = row[:3]
+            bucket = self._bucket_for(bucket_start)
+            bucket.counters[dimension][key] = dict(zip(COUNTER_FIELDS, row[3:]))
+
+    def record(
+        self,
+        user: str,
+        role: str,
+        latency: float,
+        usage: Optional[Dict] = None,
+        error: bool = False,
+    ):
+        """채팅 요청 한 건 집계 (응답 경로에서 호출, O(1))"""
+        self.start()
+        usage = usage or {}
+        latency_ms = latency * 1000
+        event = {
+            "requests": 1,
+            "errors": 1 if error else 0,
+            "latency_sum_ms": latency_ms,
+            "latency_max_ms": latency_ms,
+            "prompt_tokens": usage.get("prompt_tokens", 0) or 0,
+            "completion_tokens": usage.get("completion_tokens", 0) or 0,
+            "total_tokens": usage.get("total_tokens", 0) or 0,
+        }
+        bucket = self._bucket_for(time.time())
+        bucket.add("user", user, event)
+        bucket.add("role", role, event)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.rollup_interval)
+            await self._safe_rollup()
+
+    async def _safe_rollup(self):
+        try:
+            await self.rollup()
+        except sqlite3.Error as e:
+            print(f"[DEBUG] 사용량 집계 저장 실패: {e}")
+
+    async def rollup(self):
+        """마지막 저장 이후의 증분을 집계 테이블에 더함"""
+        if self._conn is None:
+            return
+        buckets = self._retired + [b for b in self._buckets if b is not None]
+        self._retired = []
+        taken = []
+        rows = []
+        for bucket in buckets:
+            if not bucket.dirty:
+                continue
+            pending = bucket.take_pending()
+            taken.append((bucket, pending))
+            for dimension, counters in pending.items():
+                for key, c in counters.items():
+                    rows.append(
+                        (bucket.start, dimension, key)
+                        + tuple(c[field] for field in COUNTER_FIELDS)
+                    )
+        if not rows:
+            return
+
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_rows, rows)
+        except sqlite3.Error:
+            # 다음 저장 때 다시 시도 (링에서 밀려난 버킷은 보관 목록으로)
+            for bucket, pending in taken:
+                bucket.restore_pending(pending)
+                if self._buckets[self._index(bucket.start)] is not bucket:
+                    self._retired.append(bucket)
+            raise
+        self.last_rollup_ms = (time.perf_counter() - start) * 1000
+
+    def _write_rows(self, rows):
+        with self._conn:
+            self._conn.executemany(_UPSERT, rows)
+
+    async def close(self):
+        """주기 작업 중지 후 마지막으로 한 번 저장"""
+        if self._task is not None and self._task.get_loop() is asyncio.get_running_loop():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._safe_rollup()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _aggregate_memory(self, since: int) -> Dict[str, Dict]:
+        totals = {dim: {} for dim in DIMENSIONS}
+        hourly: Dict[int, Dict] = {}
+        for bucket in self._buckets:
+            if bucket is None or bucket.start < since:
+                continue
+            for dimension, counters in bucket.counters.items():
+                for key, c in counters.items():
+                    _merge(totals[dimension].setdefault(key, _new_counter()), c)
+                    if dimension == "user":
+                        _merge(hourly.setdefault(bucket.start, _new_counter()), c)
+        totals["bucket"] = hourly
+        return totals
+
+    def _aggregate_rollup(self, since: int) -> Dict[str, Dict]:
+        totals = {dim: {} for dim in DIMENSIONS}
+        hourly: Dict[int, Dict] = {}
+        cursor = self._conn.execute(
+            "SELECT bucket_start, dimension, key, "
+            + ", ".join(COUNTER_FIELDS)
+            + " FROM usage_rollup WHERE bucket_start >= ?",
+            (since,),
+        )
+        for row in cursor:
+            bucket_start, dimension, key = row[:3]
+            c = dict(zip(COUNTER_FIELDS, row[3:]))
+            _merge(totals[dimension].setdefault(key, _new_counter()), c)
+            if dimension == "user":
+                _merge(hourly.setdefault(bucket_start, _new_counter()), c)
+        totals["bucket"] = hourly
+        return totals
+
+    async def query(
+        self, window_hours: int = 24, limit: int = 10, by: str = "requests"
+    ):
+        """최근 window_hours 동안의 상위 사용자/역할과 토큰 사용량"""
+        now_start = self._bucket_start(time.time())
+        window_buckets = max(1, window_hours * 3600 // self.bucket_seconds)
+        since = now_start - (window_buckets - 1) * self.bucket_seconds
+
+        if window_buckets <= self.num_buckets:
+            # 링 버퍼에 남아 있는 범위는 메모리에서 바로 계산
+            source = "memory"
+            totals = self._aggregate_memory(since)
+        else:
+            # 더 긴 구간은 최신 값을 저장한 뒤 집계 테이블에서 계산
+            source = "rollup"
+            self.start()
+            await self.rollup()
+            totals = await asyncio.to_thread(self._aggregate_rollup, since)
+
+        sort_field = "total_tokens" if by == "tokens" else "requests"
+
+        def top(dimension: str) -> List[Dict]:
+            items = sorted(
+                totals[dimension].items(),
+                key=lambda item: item[1][sort_field],
+                reverse=True,
+            )[:limit]
+            return [{dimension: key, **_summary(c)} for key, c in items]
+
+        overall = _new_counter()
+        for c in totals["user"].values():
+            _merge(overall, c)
+
+        return {
+            "window_hours": window_hours,
+            "source": source,
+            "totals": _summary(overall),
+            "top_users": top("user"),
+            "top_roles": top("role"),
+            "buckets": [
+                {
+                    "start": datetime.datetime.fromtimestamp(start).isoformat(),
+                    **_summary(c),
+                }
+                for start, c in sorted(totals["bucket"].items())
+            ],
+        }
+
+
+def _summary(c: Dict) -> Dict:
+    requests = c["requests"]
+    return {
+        "requests": requests,
+        "errors": c["errors"],
+        "avg_latency_ms": round(c["latency_sum_ms"] / requests, 2) if requests else 0,
+        "max_latency_ms": round(c["latency_max_ms"], 2),
+        "prompt_tokens": c["prompt_tokens"],
+        "completion_tokens": c["completion_tokens"],
+        "total_tokens": c["total_tokens"],
+    }
@@ -0,0 +1,421 @@
+# asyncio 기반 채팅 클라이언트
+# httpx.AsyncClient 하나로 연결을 재사용하고, 타임아웃/재시도를 적용하며
+# 서로 독립적인 요청(역할 채팅 여러 개, /test 점검 항목 등)을 동시에 실행합니다
+# 실행: python chat_client.py --async
+import asyncio
+import threading
+from typing import List, Optional, Tuple
+
+import httpx
+
+from chat_client import ChatClient, print_history, print_profile, print_users
+from compression import gzip_json_body
+
+# 연결 실패나 서버 혼잡(503) 시 재시도 횟수와 기본 대기 시간 (초)
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+
+class ChatClientError(Exception):
+    """서버 요청 실패 (message는 사용자에게 그대로 보여줄 문구)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class AsyncChatClient:
+    def __init__(
+        self,
+        server_url="http://127.0.0.1:8000",
+        timeout: float = 60.0,
+        max_connections: int = 10,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.server_url = server_url
+        self.max_retries = max_retries
+        # 연결 풀을 공유하는 클라이언트 (세션 쿠키 자동 관리)
+        self.client = httpx.AsyncClient(
+            base_url=server_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.current_user = None
+        self.conversation_history = []
+        # 조건부 GET용 로컬 캐시 (경로 -> (ETag, 응답 데이터))
+        self.response_cache = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """재시도 포함 요청 전송
+
+        연결 실패와 503(부하 차단)은 서버가 요청을 처리하지 않은 경우라 항상 재시도하고,
+        응답 대기 중 타임아웃은 GET 요청만 재시도합니다.
+        """
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = await self.client.request(method, path, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if last:
+                    raise ChatClientError(f"서버 연결 오류: {e}")
+                await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+                continue
+            except httpx.TimeoutException as e:
+                if last or method != "GET":
+                    raise ChatClientError(f"요청 시간 초과: {e}")
+                await asyncio.sleep(RETRY_BACKOFF * 2**attempt)
+                continue
+            except httpx.HTTPError as e:
+                raise ChatClientError(f"서버 연결 오류: {e}")
+
+            if response.status_code == 503 and not last:
+                retry_after = response.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else 0.0
+                await asyncio.sleep(max(delay, RETRY_BACKOFF * 2**attempt))
+                continue
+            return response
+
+    @staticmethod
+    def _raise_for_error(response: httpx.Response, action: str):
+        if response.status_code in (200, 304):
+            return
+        if response.status_code == 401:
+            raise ChatClientError("로그인이 필요합니다.", 401)
+        try:
+            detail = response.json().get("detail", "알 수 없는 오류")
+        except ValueError:
+            detail = "알 수 없는 오류"
+        raise ChatClientError(f"{action} 실패: {detail}", response.status_code)
+
+    async def _conditional_get(self, path: str, action: str):
+        """ETag가 있으면 If-None-Match로 요청하고, 304면 캐시된 데이터 사용"""
+        headers = {}
+        cached = self.response_cache.get(path)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        response = await self._request("GET", path, headers=headers)
+        self._raise_for_error(response, action)
+
+        if response.status_code == 304 and cached:
+            return cached[1]
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            self.response_cache[path] = (etag, data)
+        return data
+
+    # ---------- API 호출 (출력 없음, 실패 시 ChatClientError) ----------
+
+    async def register(self, username: str, password: str):
+        response = await self._request(
+            "POST", "/user", json={"username": username, "password": password}
+        )
+        self._raise_for_error(response, "회원가입")
+        return response.json()
+
+    async def login(self, username: str, password: str):
+        response = await self._request(
+            "POST", "/user/login", json={"username": username, "password": password}
+        )
+        self._raise_for_error(response, "로그인")
+        result = response.json()
+        self.current_user = username
+        # 액세스 토큰이 있으면 이후 요청은 토큰으로 인증
+        if result.get("access_token"):
+            self.client.headers["Authorization"] = f"Bearer {result['access_token']}"
+        return result
+
+    async def logout(self):
+        response = await self._request("POST", "/user/logout")
+        self._raise_for_error(response, "로그아웃")
+        self.current_user = None
+        self.conversation_history = []
+        self.response_cache = {}
+        self.client.headers.pop("Authorization", None)
+        return response.json()
+
+    async def profile(self):
+        response = await self._request("GET", "/user/profile")
+        self._raise_for_error(response, "프로필 조회")
+        return response.json()
+
+    async def users(self):
+        return await self._conditional_get("/users/", "사용자 목록 조회")
+
+    async def history(self):
+        return await self._conditional_get("/chat/history", "기록 조회")
+
+    async def clear_history(self):
+        response = await self._request("DELETE", "/chat/history")
+        self._raise_for_error(response, "기록 삭제")
+        return response.json()
+
+    async def send_message(self, user_message: str) -> str:
+        """대화 맥락을 유지하는 채팅 (실패하면 대화 기록에서 제외)"""
+        messages = self.conversation_history + [
+            {"role": "user", "content": user_message}
+        ]
+        # 대화가 길어지면 요청 본문을 gzip으로 압축해서 전송
+        body, headers = gzip_json_body({"messages": messages})
+        response = await self._request(
+            "POST", "/chat/conversation", content=body, headers=headers
+        )
+        self._raise_for_error(response, "채팅")
+
+        ai_response = response.json()["response"]
+        self.conversation_history = messages + [
+            {"role": "assistant", "content": ai_response}
+        ]
+        return ai_response
+
+    async def role_chat(self, role: str, message: str) -> str:
+        response = await self._request(
+            "POST", "/chat/role", params={"role": role, "message": message}
+        )
+        self._raise_for_error(response, "역할 채팅")
+        return response.json()["ai_response"]
+
+    async def role_chats(self, requests: List[Tuple[str, str]]) -> List:
+        """여러 역할 채팅을 동시에 실행 (실패한 항목은 ChatClientError 객체로 반환)"""
+        return await asyncio.gather(
+            *(self.role_chat(role, message) for role, message in requests),
+            return_exceptions=True,
+        )
+
+    # ---------- 대화형 CLI ----------
+
+    show_help = ChatClient.show_help
+
+    async def _input(self, prompt: str) -> str:
+        # input()이 이벤트 루프를 막지 않도록 별도 스레드에서 실행
+        # (데몬 스레드라 Ctrl-C로 종료할 때 입력 대기 중인 스레드를 기다리지 않음)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def deliver(result, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def read():
+            result = error = None
+            try:
+                result = input(prompt)
+            except Exception as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(deliver, result, error)
+            except RuntimeError:
+                # 이벤트 루프가 이미 종료됨
+                pass
+
+        threading.Thread(target=read, daemon=True).start()
+        return (await future).strip()
+
+    async def _prompt_credentials(self, title: str):
+        print(f"\n=== {title} ===")
+        username = await self._input("사용자명을 입력하세요: ")
+        password = await self._input("비밀번호를 입력하세요: ")
+        if not username or not password:
+            print("사용자명과 비밀번호를 모두 입력해주세요.")
+            return None, None
+        return username, password
+
+    async def register_user(self):
+        username, password = await self._prompt_credentials("회원가입")
+        if not username:
+            return False
+        try:
+            await self.register(username, password)
+            print(f"✅ 회원가입 성공! 환영합니다, {username}님!")
+            return True
+        except ChatClientError as e:
+            print(f"❌ {e.message}")
+            return False
+
+    async def login_user(self):
+        username, password = await self._prompt_credentials("로그인")
+        if not username:
+            return False
+        try:
+            result = await self.login(username, password)
+            print(f"✅ 로그인 성공! 환영합니다, {username}님!")
+            print(f"🔐 세션 ID: {result.get('session_id', 'N/A')}")
+            return True
+        except ChatClientError as e:
+            print(f"❌ {e.message}")
+            return False
+
+    async def test_all_endpoints(self):
+        """모든 엔드포인트 테스트 (서로 독립적인 항목은 동시에 실행)"""
+        print("\n🧪 === API 엔드포인트 전체 테스트 ===")
+
+        if not self.current_user:
+            print("❌ 로그인이 필요합니다.")
+            return
+
+        results = await asyncio.gather(
+            self.profile(),
+            self.users(),
+            self.send_message("안녕하세요! 테스트 메시지입니다."),
+            self.role_chat("시인", "봄에 대해 시를 써주세요"),
+            return_exceptions=True,
+        )
+        # 채팅 기록 조회는 일반 채팅 결과가 반영된 뒤에 실행
+        history = await asyncio.gather(self.history(), return_exceptions=True)
+
+        steps = [
+            ("1. 사용자 프로필 조회 테스트", results[0], print_profile),
+            ("2. 사용자 목록 조회 테스트", results[1], print_users),
+            ("3. 일반 채팅 테스트", results[2], lambda r: print(f"AI 응답: {r}")),
+            ("4. 역할 기반 채팅 테스트", results[3], lambda r: print(f"시인 응답: {r}")),
+            ("5. 채팅 기록 조회 테스트", history[0], print_history),
+        ]
+        for title, result, show in steps:
+            print(f"\n{title}...")
+            if isinstance(result, Exception):
+                print(f"❌ {getattr(result, 'message', result)}")
+            else:
+                show(result)
+
+        print("\n✅ 모든 테스트 완료!")
+
+    async def _run_command(self, user_input: str) -> Optional[bool]:
+        """명령어 처리 (세션 종료가 필요하면 True, 명령어가 아니면 None)"""
+        command = user_input.lower()
+
+        if command == "/logout":
+            result = await self.logout()
+            print(f"👋 {result['message']}")
+            return True
+        if command == "/profile":
+            print_profile(await self.profile())
+        elif command == "/users":
+            print_users(await self.users())
+        elif command == "/history":
+            print_history(await self.history())
+        elif command == "/clear-server":
+            confirm = await self._input(
+                "정말로 서버의 채팅 기록을 삭제하시겠습니까? (y/N): "
+            )
+            if confirm.lower() != "y":
+                print("취소되었습니다.")
+            else:
+                print(f"🗑️ {(await self.clear_history())['message']}")
+        elif command == "/test":
+            await self.test_all_endpoints()
+        elif command == "/help":
+            self.show_help()
+        elif user_input.startswith("/role "):
+            parts = user_input[6:].split(" ", 1)
+            if len(parts) >= 2:
+                role, message = parts[0], parts[1]
+                print(f"\n[{role}] {await self.role_chat(role, message)}")
+            else:
+                print("❌ 사용법: /role 역할명 메시지")
+        else:
+            return None
+        return False
+
+    async def chat_session(self):
+        """메인 채팅 세션"""
+        print(f"\n🤖 채팅을 시작합니다! ({self.current_user}님)")
+        print("'/help'를 입력하면 명령어 도움말을 볼 수 있습니다.")
+        print("-" * 50)
+
+        while True:
+            try:
+                user_input = await self._input(f"\n[{self.current_user}] ")
+
+                if not user_input:
+                    continue
+
+                if user_input.lower() in ["/quit", "/exit"]:
+                    print("👋 채팅을 종료합니다. 안녕히 가세요!")
+                    break
+
+                handled = await self._run_command(user_input)
+                if handled:
+                    break
+                if handled is False:
+                    continue
+
+                # 일반 채팅
+                print(f"\n[AI] {await self.send_message(user_input)}")
+
+            except ChatClientError as e:
+                print(f"❌ {e.message}")
+                if e.status_code == 401:
+                    # 세션 만료
+                    self.current_user = None
+                    break
+            except EOFError:
+                # Ctrl-C는 asyncio.run 밖(chat_client.main)에서 처리
+                print("\n\n👋 채팅을 종료합니다. 안녕히 가세요!")
+                break
+            except Exception as e:
+                print(f"\n❌ 예상치 못한 오류: {e}")
+
+    async def run(self):
+        """메인 실행 함수"""
+        print("🚀 세션 기반 채팅 프로그램에 오신 것을 환영합니다! (async)")
+
+        try:
+            response = await self._request("GET", "/")
+            if response.status_code != 200:
+                print("❌ 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인해주세요.")
+                return
+        except ChatClientError:
+            print("❌ 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인해주세요.")
+            return
+
+        while True:
+            if not self.current_user:
+                print("\n1. 회원가입")
+                print("2. 로그인")
+                print("3. 종료")
+
+                choice = await self._input("\n선택하세요 (1-3): ")
+
+                if choice == "1":
+                    await self.register_user()
+                elif choice == "2":
+                    if await self.login_user():
+                        await self.chat_session()
+                elif choice == "3":
+                    print("👋 프로그램을 종료합니다.")
+                    break
+                else:
+                    print("❌ 올바른 번호를 선택해주세요.")
+            else:
+                await self.chat_session()
+                self.current_user = None
+
+
+async def main():
+    async with AsyncChatClient() as client:
+        await client.run()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n\n👋 채팅을 종료합니다. 안녕히 가세요!")
@@ -0,0 +1,192 @@
+# ChatClient <-> 서버 압축 전송 벤치마크
+# 10/100/500턴 대화에 대해 압축 없음/압축 사용 시 전송 바이트와 지연시간을 비교합니다
+# 업스트림은 재생 모드(traffic.py)의 가짜 응답을 사용하므로 네트워크가 필요 없습니다
+# 사용 예: python bench_compression.py --repeat 20 --mbps 10
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="요청/응답 압축 벤치마크")
+    parser.add_argument("--turns", default="10,100,500", help="대화 길이 목록")
+    parser.add_argument("--repeat", type=int, default=10, help="크기별 반복 횟수")
+    parser.add_argument(
+        "--mbps", type=float, default=10.0, help="전송 시간 추정에 사용할 대역폭(Mbps)"
+    )
+    return parser.parse_args()
+
+
+# 턴마다 다른 내용을 만들기 위한 재료 (같은 문장을 반복하면 압축률이 비현실적으로 높아짐)
+TOPICS = [
+    "리스트 컴프리헨션",
+    "딕셔너리",
+    "제너레이터",
+    "데코레이터",
+    "클래스 상속",
+    "예외 처리",
+    "asyncio",
+    "타입 힌트",
+    "정규 표현식",
+    "파일 입출력",
+    "가상 환경",
+    "단위 테스트",
+    "람다 함수",
+    "슬라이싱",
+    "집합 연산",
+]
+QUESTION_TEMPLATES = [
+    "{topic}을(를) {n}줄 이내 예제로 설명해 주세요.",
+    "{topic}에서 자주 하는 실수 {n}가지는 무엇인가요?",
+    "{topic}와(과) {other}의 차이가 궁금합니다. 언제 어떤 것을 써야 하나요?",
+    "{topic}을(를) 사용한 코드가 {n}초나 걸리는데 더 빠르게 만들 수 있을까요?",
+]
+WORDS = (
+    "값 변수 함수 객체 메서드 인자 반환 반복 조건 인덱스 키 요소 모듈 패키지 "
+    "성능 메모리 속도 가독성 구조 패턴 오류 호출 범위 결과 입력 출력 처리 변환"
+).split()
+
+
+def _answer(rng, topic: str) -> str:
+    sentences = []
+    for _ in range(rng.randint(3, 6)):
+        words = rng.sample(WORDS, rng.randint(5, 9))
+        name = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6))
+        sentences.append(
+            f"{topic}에서는 {' '.join(words)}을(를) 고려합니다. "
+            f"예: {name} = [x * {rng.randint(2, 99)} for x in range({rng.randint(1, 1000)})]"
+        )
+    return " ".join(sentences)
+
+
+def build_conversation(turns: int):
+    """사용자/AI가 번갈아 말하는 turns턴짜리 대화 (턴마다 내용이 다름, 시드 고정)"""
+    rng = random.Random(turns)
+    messages = []
+    for _ in range(turns):
+        topic, other = rng.sample(TOPICS, 2)
+        question = rng.choice(QUESTION_TEMPLATES).format(
+            topic=topic, other=other, n=rng.randint(2, 30)
+        )
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": _answer(rng, topic)})
+    messages.append({"role": "user", "content": "마지막 질문입니다."})
+    return messages
+
+
+def write_fake_recording(path: str):
+    # 키가 일치하지 않아도 순서대로 재생되므로 한 건이면 충분
+    rng = random.Random(0)
+    ai_text = " ".join(_answer(rng, topic) for topic in TOPICS[:4])
+    record = {
+        "key": "",
+        "started_at": 0,
+        "tag": {},
+        "method": "POST",
+        "url": "",
+        "request_body": "[]",
+        "latency_ms": 0,
+        "status_code": 200,
+        "response_headers": {"content-type": "application/json"},
+        "response_body": json.dumps(
+            {
+                "choices": [{"message": {"content": ai_text}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+            },
+            ensure_ascii=False,
+        ),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+async def measure(app, messages, compress: bool, repeat: int):
+    import httpx
+    from compression import gzip_json_body
+
+    accept = "gzip" if compress else "identity"
+    min_size = 0 if compress else float("inf")
+    transport = httpx.ASGITransport(app=app)
+
+    up_bytes = down_bytes = 0
+    latencies = []
+    for i in range(repeat):
+        # 세션 쿠키(대화 기록)가 계속 커지지 않도록 매번 새 클라이언트로 로그인
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://testserver",
+            headers={"Accept-Encoding": accept},
+        ) as client:
+            await client.post(
+                "/user/login", json={"username": "bench", "password": "bench"}
+            )
+
+            start = time.perf_counter()
+            body, headers = gzip_json_body({"messages": messages}, min_size=min_size)
+            response = await client.post(
+                "/chat/conversation", content=body, headers=headers
+            )
+            history = await client.get("/chat/history")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            assert response.status_code == 200, response.text
+            up_bytes = len(body)
+            down_bytes = response.num_bytes_downloaded + history.num_bytes_downloaded
+
+    return up_bytes, down_bytes, statistics.median(latencies)
+
+
+async def run(args):
+    import main
+
+    async with main.lifespan(main.app):
+        import httpx
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://testserver"
+        ) as client:
+            await client.post("/user", json={"username": "bench", "password": "bench"})
+
+        bytes_per_ms = args.mbps * 1_000_000 / 8 / 1000
+        header = f"{'turns':>6} {'mode':>6} {'up B':>10} {'down B':>10} {'cpu ms':>8} {'wire ms':>8} {'total ms':>9}"
+        print(header)
+        print("-" * len(header))
+        for turns in [int(t) for t in args.turns.split(",")]:
+            messages = build_conversation(turns)
+            for compress in (False, True):
+                up, down, cpu_ms = await measure(
+                    main.app, messages, compress, args.repeat
+                )
+                wire_ms = (up + down) / bytes_per_ms
+                print(
+                    f"{turns:>6} {'gzip' if compress else 'raw':>6} {up:>10} {down:>10} "
+                    f"{cpu_ms:>8.2f} {wire_ms:>8.2f} {cpu_ms + wire_ms:>9.2f}"
+                )
+
+
+def main():
+    args = parse_args()
+    tmp = tempfile.mkdtemp(prefix="bench_compression_")
+    recording = os.path.join(tmp, "upstream.jsonl")
+    write_fake_recording(recording)
+
+    # main 임포트 전에 재생 모드 및 임시 저장 경로 설정
+    os.environ["UPSTREAM_MODE"] = "replay"
+    os.environ["UPSTREAM_TRAFFIC_FILE"] = recording
+    os.environ["UPSTREAM_REPLAY_SPEED"] = "0"
+    os.environ["CHAT_DB_PATH"] = os.path.join(tmp, "chat_history.db")
+    os.environ["CHAT_JOURNAL_PATH"] = os.path.join(tmp, "chat_history.journal")
+    os.environ["ANALYTICS_DB_PATH"] = os.path.join(tmp, "analytics.db")
+    # 매 요청이 업스트림 재생 경로를 거치도록 프롬프트 캐시 비활성화
+    os.environ["PROMPT_CACHE_ENABLED"] = "0"
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
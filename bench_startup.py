@@ -0,0 +1,108 @@
+# 서버 시작 시간 벤치마크
+# - main 모듈 임포트 시간 (새 파이썬 프로세스에서 측정)
+# - 임포트 직후 불필요하게 로드된 무거운 모듈 (uvicorn, httpx, jinja2)
+# - 프로세스 시작부터 첫 요청(GET /) 성공까지 걸린 시간 (uvicorn 실행)
+# 사용 예: python bench_startup.py --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HEAVY_MODULES = ["uvicorn", "httpx", "jinja2"]
+
+IMPORT_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - start) * 1000
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"import_ms": elapsed, "loaded": loaded}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="서버 시작 시간 벤치마크")
+    parser.add_argument("--runs", type=int, default=5, help="반복 횟수")
+    parser.add_argument("--port", type=int, default=8765, help="첫 요청 측정용 포트")
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="서버 대기 시간(초)"
+    )
+    return parser.parse_args()
+
+
+def measure_import():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_first_request(port: int, timeout: float, env: dict) -> float:
+    """uvicorn 프로세스 시작부터 GET /가 200을 반환할 때까지의 시간 (ms)"""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            f"import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='error')",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/", timeout=1
+                ) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("서버가 제한 시간 안에 응답하지 않았습니다")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    args = parse_args()
+    # 서버 프로세스가 작업 디렉터리 기준으로 main을 찾도록 설정
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # 서버 시작 시 생성되는 채팅 기록/사용량 DB는 소스 트리가 아니라 임시 디렉터리에 생성
+    tmp = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(
+        os.environ,
+        CHAT_DB_PATH=os.path.join(tmp, "chat_history.db"),
+        CHAT_JOURNAL_PATH=os.path.join(tmp, "chat_history.journal"),
+        ANALYTICS_DB_PATH=os.path.join(tmp, "analytics.db"),
+    )
+
+    imports = [measure_import() for _ in range(args.runs)]
+    first_requests = [
+        measure_first_request(args.port, args.timeout, env) for _ in range(args.runs)
+    ]
+
+    import_ms = [r["import_ms"] for r in imports]
+    result = {
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(import_ms), 2),
+        "import_ms_min": round(min(import_ms), 2),
+        "heavy_modules_loaded_on_import": imports[-1]["loaded"],
+        "first_request_ms_median": round(statistics.median(first_requests), 2),
+        "first_request_ms_min": round(min(first_requests), 2),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,47 @@ import requests
 import json
 import sys
 from typing import List, Dict
+from compression import gzip_json_body
+
+
+def print_profile(result):
+    """프로필 조회 결과 출력"""
+    print(f"\n👤 사용자 프로필:")
+    print(f"   - 사용자명: {result['username']}")
+    print(f"   - 로그인 시간: {result.get('login_time', 'Unknown')}")
+    print(f"   - 세션 상태: {'활성' if result.get('session_active') else '비활성'}")
+
+
+def print_users(users):
+    """사용자 목록 출력"""
+    print(f"\n👥 등록된 사용자 목록 (총 {len(users)}명):")
+    print("-" * 40)
+    for i, user in enumerate(users, 1):
+        created_at = user["created_at"]
+        if isinstance(created_at, str):
+            created_at = created_at[:19]  # datetime 형식 단축
+        print(f"{i}. {user['username']} (가입일: {created_at})")
+
+
+def print_history(result):
+    """채팅 기록 출력 (최근 5개)"""
+    print(result)
+    print(f"\n📚 {result['user']}님의 채팅 기록 (총 {result['total_conversations']}개)")
+    print("-" * 50)
+
+    if not result["history"]:
+        print("채팅 기록이 없습니다.")
+    else:
+        for i, chat in enumerate(result["history"][-5:], 1):  # 최근 5개만 표시
+            timestamp = chat["timestamp"][:19] if chat["timestamp"] else "Unknown"
+            print(f"{i}. [{timestamp}]")
+            print(
+                f"   User: {chat['user_message'][:50]}{'...' if len(chat['user_message']) > 50 else ''}"
+            )
+            print(
+                f"   AI: {chat['ai_response'][:50]}{'...' if len(chat['ai_response']) > 50 else ''}"
+            )
+            print()
 
 
 class ChatClient:
@@ -10,6 +51,8 @@ class ChatClient:
         self.session = requests.Session()  # 세션 쿠키 자동 관리
         self.current_user = None
         self.conversation_history = []
+        # 조건부 GET용 로컬 캐시 (경로 -> (ETag, 응답 데이터))
+        self.response_cache = {}
 
     def register_user(self):
         """사용자 회원가입"""
@@ -58,6 +101,11 @@ class ChatClient:
             if response.status_code == 200:
                 result = response.json()
                 self.current_user = username
+                # 액세스 토큰이 있으면 이후 요청은 토큰으로 인증
+                if result.get("access_token"):
+                    self.session.headers["Authorization"] = (
+                        f"Bearer {result['access_token']}"
+                    )
                 print(f"✅ 로그인 성공! 환영합니다, {username}님!")
                 print(f"🔐 세션 ID: {result.get('session_id', 'N/A')}")
                 return True
@@ -80,6 +128,8 @@ class ChatClient:
                 print(f"👋 {result['message']}")
                 self.current_user = None
                 self.conversation_history = []
+                self.response_cache = {}
+                self.session.headers.pop("Authorization", None)
                 return True
             else:
                 print("❌ 로그아웃 처리 중 오류가 발생했습니다.")
@@ -96,12 +146,7 @@ class ChatClient:
 
             if response.status_code == 200:
                 result = response.json()
-                print(f"\n👤 사용자 프로필:")
-                print(f"   - 사용자명: {result['username']}")
-                print(f"   - 로그인 시간: {result.get('login_time', 'Unknown')}")
-                print(
-                    f"   - 세션 상태: {'활성' if result.get('session_active') else '비활성'}"
-                )
+                print_profile(result)
                 return result
             elif response.status_code == 401:
                 print("❌ 로그인이 필요합니다.")
@@ -115,20 +160,32 @@ class ChatClient:
             print(f"❌ 서버 연결 오류: {e}")
             return None
 
+    def _conditional_get(self, path):
+        """ETag가 있으면 If-None-Match로 요청하고, 304면 캐시된 데이터 사용"""
+        headers = {}
+        cached = self.response_cache.get(path)
+        if cached:
+            headers["If-None-Match"] = cached[0]
+
+        response = self.session.get(f"{self.server_url}{path}", headers=headers)
+
+        if response.status_code == 304 and cached:
+            return response, cached[1]
+        if response.status_code == 200:
+            data = response.json()
+            etag = response.headers.get("ETag")
+            if etag:
+                self.response_cache[path] = (etag, data)
+            return response, data
+        return response, None
+
     def get_all_users(self):
         """모든 사용자 목록 조회 (로그인 필요)"""
         try:
-            response = self.session.get(f"{self.server_url}/users/")
+            response, users = self._conditional_get("/users/")
 
-            if response.status_code == 200:
-                users = response.json()
-                print(f"\n👥 등록된 사용자 목록 (총 {len(users)}명):")
-                print("-" * 40)
-                for i, user in enumerate(users, 1):
-                    created_at = user["created_at"]
-                    if isinstance(created_at, str):
-                        created_at = created_at[:19]  # datetime 형식 단축
-                    print(f"{i}. {user['username']} (가입일: {created_at})")
+            if users is not None:
+                print_users(users)
                 return users
             elif response.status_code == 401:
                 print("❌ 로그인이 필요합니다.")
@@ -145,34 +202,10 @@ class ChatClient:
     def get_chat_history(self):
         """서버에서 채팅 기록 조회"""
         try:
-            response = self.session.get(f"{self.server_url}/chat/history")
-
-            if response.status_code == 200:
-                result = response.json()
-                print(result)
-                print(
-                    f"\n📚 {result['user']}님의 채팅 기록 (총 {result['total_conversations']}개)"
-                )
-                print("-" * 50)
-
-                if not result["history"]:
-                    print("채팅 기록이 없습니다.")
-                else:
-                    for i, chat in enumerate(
-                        result["history"][-5:], 1
-                    ):  # 최근 5개만 표시
-                        timestamp = (
-                            chat["timestamp"][:19] if chat["timestamp"] else "Unknown"
-                        )
-                        print(f"{i}. [{timestamp}]")
-                        print(
-                            f"   User: {chat['user_message'][:50]}{'...' if len(chat['user_message']) > 50 else ''}"
-                        )
-                        print(
-                            f"   AI: {chat['ai_response'][:50]}{'...' if len(chat['ai_response']) > 50 else ''}"
-                        )
-                        print()
+            response, result = self._conditional_get("/chat/history")
 
+            if result is not None:
+                print_history(result)
                 return result
             elif response.status_code == 401:
                 print("❌ 로그인이 필요합니다.")
@@ -220,9 +253,10 @@ class ChatClient:
         self.conversation_history.append({"role": "user", "content": user_message})
 
         try:
+            # 대화가 길어지면 요청 본문을 gzip으로 압축해서 전송
+            body, headers = gzip_json_body({"messages": self.conversation_history})
             response = self.session.post(
-                f"{self.server_url}/chat/conversation",
-                json={"messages": self.conversation_history},
+                f"{self.server_url}/chat/conversation", data=body, headers=headers
             )
 
             if response.status_code == 200:
@@ -432,6 +466,18 @@ class ChatClient:
 
 
 def main():
+    # --async 옵션이면 asyncio 기반 클라이언트로 실행
+    if "--async" in sys.argv[1:]:
+        import asyncio
+        from async_chat_client import main as async_main
+
+        # asyncio.run 안에서는 Ctrl-C가 CancelledError로 전달되므로 바깥에서 처리
+        try:
+            asyncio.run(async_main())
+        except KeyboardInterrupt:
+            print("\n\n👋 채팅을 종료합니다. 안녕히 가세요!")
+        return
+
     client = ChatClient()
     client.run()
 
@@ -0,0 +1,131 @@
+# 요청/응답 본문 압축 관련 모듈
+# - GzipRequestMiddleware: gzip으로 압축해서 보낸 요청 본문을 풀어서 라우터에 전달
+# - gzip_json_body: 일정 크기 이상의 JSON 본문을 gzip으로 압축 (클라이언트용)
+# 응답 압축은 starlette의 GZipMiddleware(Accept-Encoding 협상)를 사용합니다
+import gzip
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+# 압축된 요청 본문을 받을 경로
+COMPRESSED_REQUEST_PATHS = {"/chat/conversation", "/chat/role"}
+# 압축 해제 후 허용하는 최대 크기 (압축 폭탄 방지)
+MAX_DECOMPRESSED_SIZE = 10 * 1024 * 1024
+# 압축된 상태로 받을 수 있는 최대 크기 (해제 전 메모리 사용량 제한)
+MAX_COMPRESSED_SIZE = 2 * 1024 * 1024
+# 이 크기 이상일 때만 압축 (작은 본문은 압축 이득보다 비용이 큼)
+COMPRESS_MIN_SIZE = 1024
+
+
+def gzip_json_body(
+    payload: Any, min_size: int = COMPRESS_MIN_SIZE
+) -> Tuple[bytes, Dict[str, str]]:
+    """JSON 직렬화 후 min_size 이상이면 gzip 압축 (본문, 헤더) 반환"""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(body) >= min_size:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def _decompress(body: bytes, max_size: int) -> Tuple[Optional[bytes], int]:
+    """gzip 본문 해제 (데이터, 상태 코드) 반환 (손상/잘림 시 400, max_size 초과 시 413)"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_size + 1)
+    except zlib.error:
+        return None, 400
+    if len(data) > max_size or decompressor.unconsumed_tail:
+        return None, 413
+    # 잘린 본문(스트림 끝 없음)이나 첫 gzip 멤버 뒤의 추가 데이터는 손상으로 처리
+    if not decompressor.eof or decompressor.unused_data:
+        return None, 400
+    return data, 200
+
+
+class GzipRequestMiddleware:
+    """채팅 엔드포인트에서 gzip으로 압축된 요청 본문을 받아주는 ASGI 미들웨어"""
+
+    def __init__(
+        self,
+        app,
+        max_size: int = MAX_DECOMPRESSED_SIZE,
+        max_compressed_size: int = MAX_COMPRESSED_SIZE,
+    ):
+        self.app = app
+        self.max_size = max_size
+        self.max_compressed_size = max_compressed_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in COMPRESSED_REQUEST_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").strip().lower()
+        if encoding != b"gzip":
+            await self.app(scope, receive, send)
+            return
+
+        too_large = "요청 본문이 너무 큽니다"
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_compressed_size:
+            await self._error(send, 413, too_large)
+            return
+
+        # 압축된 본문 수신 (max_compressed_size를 넘으면 바로 중단)
+        chunks = []
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            if received > self.max_compressed_size:
+                await self._error(send, 413, too_large)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+
+        data, status = _decompress(b"".join(chunks), self.max_size)
+        if data is None:
+            detail = too_large if status == 413 else "압축된 요청 본문을 해제할 수 없습니다"
+            await self._error(send, status, detail)
+            return
+
+        # 압축 해제된 본문 기준으로 헤더 수정
+        new_headers = [
+            (k, v)
+            for k, v in scope["headers"]
+            if k not in (b"content-encoding", b"content-length")
+        ]
+        new_headers.append((b"content-length", str(len(data)).encode()))
+        scope = dict(scope, headers=new_headers)
+
+        sent = False
+
+        async def receive_decompressed():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": data, "more_body": False}
+            return await receive()
+
+        await self.app(scope, receive_decompressed, send)
+
+    async def _error(self, send, status: int, detail: str):
+        body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
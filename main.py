@@ -1,46 +1,139 @@
-from fastapi import FastAPI, HTTPException, Request, Form, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, Request, Response, Form, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from models import User, ChatResponse, ConversationRequest, Message, LoginRequest
 
 from typing import List, Dict, Optional
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-import uvicorn
 import datetime
 import hashlib
-import httpx
+import os
+import time
+from admission import AdmissionController, LoadSheddingMiddleware
+from snapshot import SnapshotCache, conditional_json, make_etag
+from persistence import TurnWriter
+from analytics import UsageAnalytics
+from prompt_cache import PromptCache, USER_PLACEHOLDER, render_template
+from compression import GzipRequestMiddleware
+from tokens import issue_token, verify_token, revoke_token, TOKEN_TTL
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import sys
 
-app = FastAPI(title="부트캠프 ChatGPT API 서버", version="0.0.1")
-app.add_middleware(SessionMiddleware, secret_key="your_secret_key")
-templates = Jinja2Templates(directory="templates")
+# uvicorn, httpx, jinja2 같은 선택적 하위 시스템은 임포트 시점이 아니라 처음 사용할 때 불러옵니다
+# (워커 생성, 테스트 시작 시간 단축)
 
-# CORS 설정
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["127.0.0.1", "http://localhost:3000", "http://localhost:8000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# 채팅 기록 write-behind 저장 (응답 경로에서는 큐에 넣기만 함, DB 연결은 시작 시)
+turn_writer = TurnWriter()
+
+# 사용자/역할/시간대별 사용량 집계 (고정 크기 시간 버킷)
+usage_analytics = UsageAnalytics()
+
+# 정규화/유사 질문 캐시 (같은 질문이면 업스트림 호출 생략)
+prompt_cache = PromptCache()
+
+# 과부하 시 우선순위가 낮은 요청부터 거절
+admission_controller = AdmissionController()
+
+
+def get_upstream():
+    """업스트림 호출 모듈 (httpx 포함, 첫 채팅 요청 시 임포트)
+
+    공유 HTTP 클라이언트는 get_http_client(), 오류는 UpstreamTimeout/UpstreamStatusError로 처리
+    """
+    import traffic
+
+    return traffic
+
+
+@lru_cache(maxsize=None)
+def get_templates():
+    """Jinja2 템플릿 (템플릿을 렌더링하는 라우트에서 처음 호출할 때 생성)"""
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory="templates")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 시작 시 저널 복구, 종료 시 남은 기록 저장
+    # (큐, 백그라운드 작업, HTTP 클라이언트는 실행 중인 이벤트 루프 기준으로 생성)
+    turn_writer.start()
+    usage_analytics.start()
+    yield
+    await turn_writer.close()
+    await usage_analytics.close()
+    await admission_controller.close()
+    # 채팅 요청이 없었다면 업스트림 모듈은 임포트되지 않은 상태
+    if "traffic" in sys.modules:
+        await get_upstream().close_http_client()
+
+
+router = APIRouter()
 
 # 사용자 데이터 저장소 (실제 프로젝트에서는 데이터베이스 사용)
 users = []
+# 사용자 목록이 바뀔 때마다 증가하는 버전 (ETag 계산용)
+users_version = 0
+
+# 읽기 엔드포인트의 직렬화된 응답 스냅샷 (ETag 기준)
+snapshot_cache = SnapshotCache()
+# 서버 재시작 후 같은 버전 번호가 다른 데이터를 가리키지 않도록 ETag에 포함
+SERVER_BOOT_ID = str(time.time_ns())
+
+# 인증 방식
+#   - session : 로그인 정보를 세션 쿠키에 저장 (기본값)
+#   - token   : 세션을 쓰지 않고 서명된 액세스 토큰 쿠키만 발급
+# 두 방식 모두 Authorization: Bearer 헤더의 토큰을 먼저 확인합니다
+AUTH_MODE = os.environ.get("AUTH_MODE", "session")
+ACCESS_TOKEN_COOKIE = "access_token"
+# session 방식 로그인 때 함께 발급한 토큰 정보를 보관하는 세션 키
+SESSION_TOKEN_KEY = "access_token_claims"
+
+# /analytics는 모든 사용자의 사용량을 보여주므로 조회 가능한 관리자를 쉼표로 지정
+# (비어 있으면 로그인한 모든 사용자가 조회 가능 - 개발용)
+ANALYTICS_ADMINS = {
+    name.strip()
+    for name in os.environ.get("ANALYTICS_ADMINS", "").split(",")
+    if name.strip()
+}
 
 # 부트캠프 API 엔드포인트 URL
 BOOTCAMP_API_URL = "https://dev.wenivops.co.kr/services/openai-api"
+# system 메시지가 없는 대화에 넣는 기본 프롬프트 ({user} 자리에 사용자명)
+DEFAULT_SYSTEM_TEMPLATE = f"You are a helpful assistant for {USER_PLACEHOLDER}."
 
 
 # GET 요청: 서버 상태 확인
-@app.get("/")
+@router.get("/")
 async def root():
     return {"message": "부트캠프 ChatGPT API 서버가 실행 중입니다"}
 
 
+# GET 요청: 부하 차단 상태 확인 (현재 동시 처리 한도, 거절 횟수)
+@router.get("/server/load")
+async def server_load():
+    return admission_controller.stats()
+
+
+# GET 요청: 채팅 기록 저장 상태 확인 (큐 길이, 기록 지연시간, 배치 크기)
+@router.get("/server/persistence")
+async def server_persistence():
+    return turn_writer.stats()
+
+
+# GET 요청: 프롬프트 캐시 상태 확인 (적중 횟수, 생략된 업스트림 호출 수)
+@router.get("/server/prompt-cache")
+async def server_prompt_cache():
+    return prompt_cache.stats()
+
+
 #############
-@app.post("/user")
+@router.post("/user")
 async def create_user(data: User):
+    global users_version
     try:
         print(f"[DEBUG] 받은 데이터: {data}")
 
@@ -58,6 +151,7 @@ async def create_user(data: User):
             "created_at": datetime.datetime.now(),
         }
         users.append(user)
+        users_version += 1
 
         response_data = {
             "message": "사용자가 성공적으로 생성되었습니다",
@@ -75,7 +169,7 @@ async def create_user(data: User):
         raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
 
 
-# @app.post("/user")
+# @router.post("/user")
 # async def create_user(data: User):
 #     # 중복 사용자 확인
 #     print(data)
@@ -95,7 +189,19 @@ async def create_user(data: User):
 
 # 세션에서 현재 사용자 정보 가져오기 (의존성 주입)
 def get_current_user(request: Request) -> Optional[str]:
-    """세션에서 현재 로그인된 사용자 정보를 가져옵니다"""
+    """액세스 토큰 또는 세션에서 현재 로그인된 사용자 정보를 가져옵니다"""
+    # 토큰이 있으면 HMAC 검증 한 번으로 확인 (세션 내용과 무관)
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        token = authorization[7:].strip()
+    else:
+        token = request.cookies.get(ACCESS_TOKEN_COOKIE)
+    if token:
+        claims = verify_token(token)
+        request.state.token_claims = claims
+        return claims["username"] if claims else None
+
+    request.state.token_claims = None
     return request.session.get("username")
 
 
@@ -108,24 +214,48 @@ def require_login(request: Request) -> str:
     return username
 
 
-@app.post("/user/login")
-async def login_user(data: LoginRequest, request: Request):
-    """사용자 로그인 및 세션 생성"""
+@router.post("/user/login")
+async def login_user(data: LoginRequest, request: Request, response: Response):
+    """사용자 로그인 및 세션(또는 액세스 토큰) 생성"""
     for user in users:
         if user["username"] == data.username:
             if (
                 user["password"]
                 == hashlib.sha256(data.password.encode("utf-8")).hexdigest()
             ):
-                # 세션에 사용자 정보 저장
-                request.session["username"] = data.username
-                request.session["logged_in"] = True
-                request.session["login_time"] = datetime.datetime.now().isoformat()
+                access_token = issue_token(data.username)
+
+                if AUTH_MODE == "token":
+                    # 세션 대신 작은 서명 토큰 쿠키만 발급
+                    response.set_cookie(
+                        ACCESS_TOKEN_COOKIE,
+                        access_token,
+                        max_age=TOKEN_TTL,
+                        httponly=True,
+                        samesite="lax",
+                    )
+                else:
+                    # 세션에 사용자 정보 저장
+                    request.session["username"] = data.username
+                    request.session["logged_in"] = True
+                    request.session["login_time"] = datetime.datetime.now().isoformat()
+                    # 세션 쿠키만으로 로그아웃해도 함께 발급한 토큰을 폐기할 수 있도록 보관
+                    # (같은 세션에서 다시 로그인하면 이전 토큰은 폐기)
+                    previous = request.session.get(SESSION_TOKEN_KEY)
+                    if previous:
+                        revoke_token(previous)
+                    claims = verify_token(access_token)
+                    request.session[SESSION_TOKEN_KEY] = {
+                        "token_id": claims["token_id"],
+                        "expires_at": claims["expires_at"],
+                    }
 
                 return {
                     "message": "로그인 성공",
                     "username": data.username,
                     "session_id": request.session.get("_id", "generated"),
+                    "access_token": access_token,
+                    "token_type": "bearer",
                 }
 
     raise HTTPException(
@@ -133,33 +263,53 @@ async def login_user(data: LoginRequest, request: Request):
     )
 
 
-@app.post("/user/logout")
-async def logout_user(request: Request, current_user: str = Depends(require_login)):
-    """사용자 로그아웃 및 세션 삭제"""
+@router.post("/user/logout")
+async def logout_user(
+    request: Request, response: Response, current_user: str = Depends(require_login)
+):
+    """사용자 로그아웃 및 세션 삭제 (토큰은 폐기 목록에 추가)"""
+    claims = request.state.token_claims
+    if claims:
+        revoke_token(claims)
+    # 로그인 시 세션과 함께 발급한 토큰 (요청에 토큰이 없어도 폐기)
+    session_token = request.session.get(SESSION_TOKEN_KEY)
+    if session_token:
+        revoke_token(session_token)
+    if request.cookies.get(ACCESS_TOKEN_COOKIE):
+        response.delete_cookie(ACCESS_TOKEN_COOKIE)
     request.session.clear()
     return {"message": f"{current_user}님이 로그아웃되었습니다"}
 
 
-@app.get("/user/profile")
+@router.get("/user/profile")
 async def get_user_profile(
     request: Request, current_user: str = Depends(require_login)
 ):
     """현재 로그인된 사용자의 프로필 정보"""
     login_time = request.session.get("login_time")
+    claims = request.state.token_claims
+    if claims:
+        login_time = datetime.datetime.fromtimestamp(claims["issued_at"]).isoformat()
     return {"username": current_user, "login_time": login_time, "session_active": True}
 
 
-@app.get("/users/")
-async def get_users(current_user: str = Depends(require_login)):
-    """사용자 목록 조회 (로그인 필요)"""
+@router.get("/users/")
+async def get_users(request: Request, current_user: str = Depends(require_login)):
+    """사용자 목록 조회 (로그인 필요, 변경이 없으면 304)"""
+    etag = make_etag("users", SERVER_BOOT_ID, users_version)
     # 비밀번호는 제외하고 반환
-    return [
-        {"username": user["username"], "created_at": user["created_at"]}
-        for user in users
-    ]
+    return conditional_json(
+        request,
+        snapshot_cache,
+        etag,
+        lambda: [
+            {"username": user["username"], "created_at": user["created_at"]}
+            for user in users
+        ],
+    )
 
 
-@app.post("/chat/conversation", response_model=ChatResponse)
+@router.post("/chat/conversation", response_model=ChatResponse)
 async def conversation_chat(
     request_data: ConversationRequest,
     request: Request,
@@ -170,6 +320,7 @@ async def conversation_chat(
     """
     # 세션에서 사용자별 대화 기록 관리 (선택사항)
     session_key = f"conversation_history_{current_user}"
+    version_key = f"conversation_version_{current_user}"
 
     # 메시지 배열을 딕셔너리 형태로 변환
     messages = [
@@ -182,51 +333,74 @@ async def conversation_chat(
             0,
             {
                 "role": "system",
-                "content": f"You are a helpful assistant for {current_user}.",
+                "content": render_template(DEFAULT_SYSTEM_TEMPLATE, current_user),
             },
         )
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(BOOTCAMP_API_URL, json=messages, timeout=30.0)
+    upstream = get_upstream()
+    client = upstream.get_http_client()
+    ai_message = usage_info = None
+    started = time.perf_counter()
+    cache_query = prompt_cache.prepare(messages, current_user, DEFAULT_SYSTEM_TEMPLATE)
+    cached = prompt_cache.lookup(cache_query)
+    try:
+        if cached is not None:
+            # 정규화 후 같거나 거의 같은 질문이면 저장된 응답 재사용
+            # (토큰을 쓰지 않았으므로 usage는 기록하지 않음)
+            ai_message = cached[0]
+        else:
+            async with admission_controller.track_upstream():
+                response = await client.post(
+                    BOOTCAMP_API_URL,
+                    json=messages,
+                    timeout=30.0,
+                    extensions={"traffic_tag": {"endpoint": "conversation_chat"}},
+                )
 
             response.raise_for_status()
             response_data = response.json()
 
             ai_message = response_data["choices"][0]["message"]["content"]
             usage_info = response_data["usage"]
+            prompt_cache.store(cache_query, ai_message, usage_info)
+
+        # 선택사항: 세션에 대화 기록 저장
+        if session_key not in request.session:
+            request.session[session_key] = []
+
+        turn = {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "user_message": (
+                request_data.messages[-1].content if request_data.messages else ""
+            ),
+            "ai_response": ai_message,
+        }
+        request.session[session_key].append(turn)
+        turn_writer.submit(current_user, turn, usage_info)
+        request.session[version_key] = request.session.get(version_key, 0) + 1
 
-            # 선택사항: 세션에 대화 기록 저장
-            if session_key not in request.session:
-                request.session[session_key] = []
-
-            request.session[session_key].append(
-                {
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "user_message": (
-                        request_data.messages[-1].content
-                        if request_data.messages
-                        else ""
-                    ),
-                    "ai_response": ai_message,
-                }
-            )
-
-            return ChatResponse(response=ai_message, usage=usage_info)
+        return ChatResponse(
+            response=ai_message, usage=usage_info, cached=cached is not None
+        )
 
-        except httpx.TimeoutException:
-            raise HTTPException(
-                status_code=408, detail="API 요청 시간이 초과되었습니다"
-            )
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code, detail=f"API 오류: {e}"
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    except upstream.UpstreamTimeout:
+        raise HTTPException(status_code=408, detail="API 요청 시간이 초과되었습니다")
+    except upstream.UpstreamStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail=f"API 오류: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    finally:
+        # 응답을 받지 못한 요청은 오류로 집계 (캐시 적중은 usage 없이 집계)
+        usage_analytics.record(
+            current_user,
+            "conversation",
+            time.perf_counter() - started,
+            usage_info,
+            error=ai_message is None,
+        )
 
 
-@app.post("/chat/role")
+@router.post("/chat/role")
 async def role_based_chat(
     role: str, message: str, current_user: str = Depends(require_login)
 ):
@@ -241,59 +415,151 @@ async def role_based_chat(
         "여행 가이드": "assistant는 세계 여행 전문가로서, 각 도시의 관광지, 음식, 교통 팁을 제공한다.",
     }
 
-    system_message = role_prompts.get(
-        role, f"assistant는 {role}이다. 사용자 {current_user}에게 도움을 제공한다."
+    # 정해진 역할이 아니면 사용자명 자리를 남긴 템플릿으로 만들어 캐시 항목을 사용자끼리 공유
+    template = role_prompts.get(
+        role, f"assistant는 {role}이다. 사용자 {USER_PLACEHOLDER}에게 도움을 제공한다."
     )
+    system_message = render_template(template, current_user)
 
     messages = [
         {"role": "system", "content": system_message},
         {"role": "user", "content": message},
     ]
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(BOOTCAMP_API_URL, json=messages, timeout=30.0)
+    client = get_upstream().get_http_client()
+    ai_message = usage_info = None
+    started = time.perf_counter()
+    cache_query = prompt_cache.prepare(messages, current_user, template)
+    cached = prompt_cache.lookup(cache_query)
+    try:
+        if cached is not None:
+            ai_message = cached[0]
+        else:
+            async with admission_controller.track_upstream():
+                response = await client.post(
+                    BOOTCAMP_API_URL,
+                    json=messages,
+                    timeout=30.0,
+                    extensions={
+                        "traffic_tag": {"endpoint": "role_based_chat", "role": role}
+                    },
+                )
 
             response.raise_for_status()
             response_data = response.json()
+            ai_message = response_data["choices"][0]["message"]["content"]
+            usage_info = response_data["usage"]
+            prompt_cache.store(cache_query, ai_message, usage_info)
+
+        return {
+            "role": role,
+            "user": current_user,
+            "user_message": message,
+            "ai_response": ai_message,
+            "usage": usage_info,
+            "cached": cached is not None,
+        }
 
-            return {
-                "role": role,
-                "user": current_user,
-                "user_message": message,
-                "ai_response": response_data["choices"][0]["message"]["content"],
-                "usage": response_data["usage"],
-            }
-
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        usage_analytics.record(
+            current_user,
+            role,
+            time.perf_counter() - started,
+            usage_info,
+            error=ai_message is None,
+        )
 
 
-@app.get("/chat/history")
+@router.get("/chat/history")
 async def get_chat_history(
     request: Request, current_user: str = Depends(require_login)
 ):
-    """사용자의 채팅 기록 조회"""
+    """사용자의 채팅 기록 조회 (변경이 없으면 304)"""
     session_key = f"conversation_history_{current_user}"
+    version_key = f"conversation_version_{current_user}"
     history = request.session.get(session_key, [])
-    return {
-        "user": current_user,
-        "total_conversations": len(history),
-        "history": history[-10:],  # 최근 10개만 반환
-    }
+    etag = make_etag(
+        "history",
+        current_user,
+        request.session.get(version_key, 0),
+        len(history),
+        history[-1]["timestamp"] if history else "",
+    )
+    return conditional_json(
+        request,
+        snapshot_cache,
+        etag,
+        lambda: {
+            "user": current_user,
+            "total_conversations": len(history),
+            "history": history[-10:],  # 최근 10개만 반환
+        },
+    )
 
 
-@app.delete("/chat/history")
+@router.delete("/chat/history")
 async def clear_chat_history(
     request: Request, current_user: str = Depends(require_login)
 ):
     """사용자의 채팅 기록 삭제"""
     session_key = f"conversation_history_{current_user}"
+    version_key = f"conversation_version_{current_user}"
     if session_key in request.session:
         del request.session[session_key]
+        request.session[version_key] = request.session.get(version_key, 0) + 1
     return {"message": f"{current_user}의 채팅 기록이 삭제되었습니다"}
 
 
+# GET 요청: 사용량 분석 (상위 사용자/역할, 시간대별 요청 수와 토큰 사용량)
+@router.get("/analytics")
+async def get_analytics(
+    window_hours: int = 24,
+    limit: int = 10,
+    by: str = "requests",
+    current_user: str = Depends(require_login),
+):
+    """최근 window_hours 동안의 사용량 집계 (by: requests 또는 tokens, 관리자 전용)"""
+    if ANALYTICS_ADMINS and current_user not in ANALYTICS_ADMINS:
+        raise HTTPException(status_code=403, detail="관리자만 조회할 수 있습니다")
+    if window_hours < 1 or limit < 1:
+        raise HTTPException(
+            status_code=400, detail="window_hours와 limit은 1 이상이어야 합니다"
+        )
+    return await usage_analytics.query(window_hours, limit, by)
+
+
+def create_app() -> FastAPI:
+    """FastAPI 애플리케이션 생성 (미들웨어는 나중에 추가한 것이 바깥쪽에서 먼저 실행)"""
+    app = FastAPI(title="부트캠프 ChatGPT API 서버", version="0.0.1", lifespan=lifespan)
+    app.add_middleware(SessionMiddleware, secret_key="your_secret_key")
+    # 채팅 엔드포인트에서 gzip으로 압축된 요청 본문 허용
+    app.add_middleware(GzipRequestMiddleware)
+
+    # 과부하 시 우선순위가 낮은 요청부터 거절 (세션 쿠키 해석 전에 차단)
+    app.add_middleware(LoadSheddingMiddleware, controller=admission_controller)
+
+    # CORS 설정
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["127.0.0.1", "http://localhost:3000", "http://localhost:8000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Accept-Encoding에 gzip이 있으면 1KB 이상의 응답 본문 압축
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    app.include_router(router)
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
+    import uvicorn
 
     uvicorn.run(app, host="127.0.0.1", port=8000)
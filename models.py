@@ -35,7 +35,8 @@ class ConversationRequest(BaseModel):
 # 응답 모델
 class ChatResponse(BaseModel):
     response: str  # AI의 응답
-    usage: Dict  # 토큰 사용량 정보
+    usage: Optional[Dict] = None  # 토큰 사용량 정보 (캐시 적중 시 None)
+    cached: bool = False  # 프롬프트 캐시에서 가져온 응답 여부
 
 
 # 로그인 요청 모델
@@ -0,0 +1,240 @@
+# 채팅 기록 write-behind 저장 모듈
+# 응답 경로에서는 대화 한 건을 메모리 큐에 넣고 저널 파일에 한 줄 추가만 합니다
+# 백그라운드 작업이 큐를 모아서(개수 또는 시간 기준) 한 번의 트랜잭션으로 SQLite에 기록합니다
+# 서버 종료 시 큐를 비우고, 비정상 종료 후에는 저널을 다시 읽어 누락된 기록을 복구합니다
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional
+
+CHAT_DB_PATH = os.environ.get("CHAT_DB_PATH", "chat_history.db")
+CHAT_JOURNAL_PATH = os.environ.get("CHAT_JOURNAL_PATH", "chat_history.journal")
+# 한 번에 기록할 최대 건수
+FLUSH_BATCH_SIZE = int(os.environ.get("CHAT_FLUSH_BATCH_SIZE", "100"))
+# 첫 건이 들어온 뒤 기록까지 기다리는 최대 시간 (초)
+FLUSH_INTERVAL = float(os.environ.get("CHAT_FLUSH_INTERVAL", "0.5"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_turns (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    ai_response TEXT NOT NULL,
+    usage TEXT
+)
+"""
+
+_INSERT = """
+INSERT OR IGNORE INTO chat_turns
+    (id, username, timestamp, user_message, ai_response, usage)
+VALUES (:id, :username, :timestamp, :user_message, :ai_response, :usage)
+"""
+
+
+class TurnWriter:
+    """대화 기록을 큐에 모아 일괄 저장하는 write-behind 작성기"""
+
+    def __init__(
+        self,
+        db_path: str = CHAT_DB_PATH,
+        journal_path: str = CHAT_JOURNAL_PATH,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.db_path = db_path
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._journal = None
+        # 큐/이벤트는 이벤트 루프에 묶이므로 start()에서 실행 중인 루프 기준으로 생성
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        # 큐에 배치 크기만큼 쌓이면(또는 종료 요청 시) 기다리지 않고 바로 기록
+        self._batch_full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 기록에 실패해 다시 시도할 행 (저널에는 남아 있음)
+        self._failed: List[Dict] = []
+        self._closing = False
+
+        # 지표
+        self.flushed_total = 0
+        self.flush_count = 0
+        self.recovered_total = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.failed_flushes = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """DB 연결, 저널 복구, 백그라운드 기록 작업 시작"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        if self._loop is not loop:
+            # 새 루프에서 시작하면 이전 큐에 남은 행을 옮겨 담음
+            pending = []
+            while self._queue is not None and not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is not None:
+                    pending.append(row)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._batch_full = asyncio.Event()
+            for row in pending:
+                self._queue.put_nowait(row)
+        self._closing = False
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+            self._recover()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._task = loop.create_task(self._run())
+
+    def _recover(self):
+        """이전 실행에서 저널에만 남은 기록을 DB에 반영 (중복은 id로 무시)"""
+        if not os.path.exists(self.journal_path):
+            return
+        rows = []
+        with open(self.journal_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 기록 도중 종료되어 잘린 마지막 줄
+                    continue
+        if rows:
+            with self._conn:
+                self._conn.executemany(_INSERT, rows)
+            self.recovered_total += len(rows)
+        open(self.journal_path, "w").close()
+
+    def submit(self, username: str, turn: Dict, usage: Optional[Dict] = None):
+        """대화 한 건을 저장 대기열에 추가 (응답 경로에서 호출, 디스크 동기화 없음)"""
+        self.start()
+        row = {
+            "id": uuid.uuid4().hex,
+            "username": username,
+            "timestamp": turn["timestamp"],
+            "user_message": turn["user_message"],
+            "ai_response": turn["ai_response"],
+            "usage": json.dumps(usage, ensure_ascii=False) if usage else None,
+        }
+        self._journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._journal.flush()
+        self._queue.put_nowait(row)
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_full.set()
+
+    async def _run(self):
+        while True:
+            if self._failed:
+                # 직전 배치 재시도 (아래 대기 시간이 재시도 간격 역할)
+                batch, self._failed = self._failed, []
+            else:
+                row = await self._queue.get()
+                if row is None:
+                    return
+                batch = [row]
+
+            # 첫 건 이후 flush_interval 동안 더 모으기 (배치가 차면 즉시 기록)
+            # wait_for(queue.get())는 취소 신호를 삼킬 수 있어 Event + asyncio.wait 사용
+            if self._queue.qsize() < self.batch_size - len(batch):
+                self._batch_full.clear()
+                waiter = asyncio.ensure_future(self._batch_full.wait())
+                try:
+                    await asyncio.wait({waiter}, timeout=self.flush_interval)
+                finally:
+                    waiter.cancel()
+
+            stop = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+
+            if not await self._flush(batch):
+                self._failed = batch
+                if stop or self._closing:
+                    # 저장하지 못한 행은 저널에 남아 다음 시작 시 복구됨
+                    return
+                if len(batch) >= self.batch_size:
+                    await asyncio.sleep(self.flush_interval)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[Dict]) -> bool:
+        """배치 기록 (실패하면 False, 저널은 그대로 유지)"""
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except (sqlite3.Error, OSError) as e:
+            self.failed_flushes += 1
+            self.last_error = str(e)
+            print(f"[DEBUG] 채팅 기록 저장 실패 ({len(batch)}건): {e}")
+            return False
+        elapsed = (time.perf_counter() - start) * 1000
+
+        self.flushed_total += len(batch)
+        self.flush_count += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+
+        # 큐에서 꺼낸 행이 모두 기록됐고 대기 중인 기록도 없으면 저널의 모든 내용이 DB에 반영된 상태
+        if self._queue.empty() and not self._failed:
+            self._journal.truncate(0)
+            self._journal.seek(0)
+        return True
+
+    def _write_batch(self, batch: List[Dict]):
+        # 한 배치를 하나의 트랜잭션으로 기록
+        with self._conn:
+            self._conn.executemany(_INSERT, batch)
+
+    async def close(self):
+        """남은 기록을 모두 저장하고 종료"""
+        if self._task is not None and not self._task.done():
+            self._closing = True
+            self._queue.put_nowait(None)
+            self._batch_full.set()
+            await self._task
+        self._task = None
+        # 남은 행(저장 실패분 포함)은 저널에 있으므로 다음 시작 시 복구
+        self._failed = []
+        self._queue = self._batch_full = self._loop = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "retry_pending": len(self._failed),
+            "flushed_total": self.flushed_total,
+            "flush_count": self.flush_count,
+            "recovered_total": self.recovered_total,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "failed_flushes": self.failed_flushes,
+            "last_error": self.last_error,
+            "avg_batch_size": round(self.flushed_total / self.flush_count, 2)
+            if self.flush_count
+            else 0,
+        }
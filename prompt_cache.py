@@ -0,0 +1,360 @@
+# 정규화된 프롬프트 캐시
+# - 메시지 정규화: 공백 정리, 사용자 질문은 대소문자 통일
+#   서버가 만든 템플릿 system 프롬프트는 사용자명 자리를 {user} 매개변수로 보고 키를 계산하고,
+#   응답 안의 사용자명도 {user}로 바꿔 저장했다가 적중 시 요청한 사용자 이름으로 채움
+#   그 외 system 프롬프트는 그대로 키에 포함 (사용자명이 들어 있으면 사용자별 항목)
+# - 정확히 같은(정규화 후) 대화는 해시 키로 바로 조회
+# - 단일 질문(system + user 한 개)은 MinHash/LSH로 거의 같은 질문까지 찾아서 재사용
+#   (질문 속 숫자가 모두 같을 때만, "100단어"와 "200단어"는 다른 질문)
+# 항목마다 TTL이 있고 최대 개수를 넘으면 가장 오래 쓰지 않은 항목부터 제거합니다
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "1") == "1"
+# 항목 유효 시간 (초)과 최대 항목 수
+PROMPT_CACHE_TTL = float(os.environ.get("PROMPT_CACHE_TTL", "600"))
+PROMPT_CACHE_MAX_ENTRIES = int(os.environ.get("PROMPT_CACHE_MAX_ENTRIES", "1000"))
+# 유사 질문으로 판단할 최소 Jaccard 유사도 (MinHash 추정값)
+PROMPT_CACHE_SIMILARITY = float(os.environ.get("PROMPT_CACHE_SIMILARITY", "0.9"))
+
+# MinHash 설정: 서명 64칸을 16개 밴드 x 4행으로 나눠 LSH 후보 검색
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# 문자 n-gram 크기 (한국어는 띄어쓰기 단위보다 문자 단위가 안정적)
+SHINGLE_SIZE = 3
+# 이보다 긴 질문은 유사도 검색 없이 정확히 일치할 때만 재사용
+MAX_NEAR_DUP_LENGTH = 2000
+
+# 템플릿 system 프롬프트와 저장된 응답에서 사용자명 자리
+USER_PLACEHOLDER = "{user}"
+# 이보다 짧은 사용자명은 응답 속 다른 단어와 구분하기 어려워 응답 치환을 하지 않음
+MIN_TEMPLATED_NAME_LENGTH = 3
+
+# 해시값 하위 비트로 칸을 고르고 나머지 비트를 칸 안의 값으로 사용
+_VALUE_BITS = 64 - (NUM_PERM - 1).bit_length()
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def render_template(template: str, username: str) -> str:
+    """템플릿 system 프롬프트의 {user} 자리에 사용자명 채우기"""
+    return template.replace(USER_PLACEHOLDER, username)
+
+
+def normalize_whitespace(text: str) -> str:
+    """공백을 하나로 합치고 앞뒤 공백 제거"""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def normalize_text(text: str) -> str:
+    """공백 정리 후 대소문자 통일"""
+    return normalize_whitespace(text).casefold()
+
+
+def canonicalize(
+    messages: List[Dict], username: str = "", template: Optional[str] = None
+) -> Tuple[List[Tuple[str, str]], bool]:
+    """캐시 키 계산용 메시지 정규화 (system 프롬프트는 대소문자를 유지)
+
+    system 메시지가 template에 username을 채운 것과 같으면 템플릿 자체로 바꾸고 True 반환
+    """
+    canonical = []
+    templated = False
+    rendered = render_template(template, username) if template else None
+    for msg in messages:
+        role = msg["role"].strip().lower()
+        if role == "system" and rendered is not None and msg["content"] == rendered:
+            content = normalize_whitespace(template)
+            templated = True
+        elif role == "system":
+            content = normalize_whitespace(msg["content"])
+        else:
+            content = normalize_text(msg["content"])
+        canonical.append((role, content))
+    return canonical, templated
+
+
+def _shingles(text: str) -> set:
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> Tuple[int, ...]:
+    """문자 n-gram 집합의 MinHash 서명 (one permutation hashing)
+
+    n-gram마다 해시를 한 번만 계산해 칸별 최솟값을 구하므로 길이에 비례하는 시간만 걸림
+    비어 있는 칸은 오른쪽으로 가장 가까운 칸의 값과 거리로 채움 (rotation densification)
+    """
+    bins: List[Optional[int]] = [None] * NUM_PERM
+    for shingle in _shingles(text):
+        h = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        index, value = h % NUM_PERM, h // NUM_PERM
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+
+    signature = []
+    for i in range(NUM_PERM):
+        distance = 0
+        while bins[(i + distance) % NUM_PERM] is None:
+            distance += 1
+        signature.append(bins[(i + distance) % NUM_PERM] + (distance << _VALUE_BITS))
+    return tuple(signature)
+
+
+def estimate_similarity(sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / NUM_PERM
+
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple]:
+    return [(i, signature[i * LSH_ROWS : (i + 1) * LSH_ROWS]) for i in range(LSH_BANDS)]
+
+
+class CacheQuery:
+    """한 요청의 캐시 키와 유사도 서명 (조회와 저장에서 한 번만 계산)"""
+
+    __slots__ = (
+        "key",
+        "system_key",
+        "signature",
+        "numbers",
+        "username",
+        "template",
+    )
+
+    def __init__(self, key, system_key, signature, numbers, username, template):
+        self.key = key
+        self.system_key = system_key
+        self.signature = signature
+        self.numbers = numbers
+        self.username = username
+        # 템플릿 system 프롬프트로 키를 만든 경우 해당 템플릿 (아니면 None)
+        self.template = template
+
+
+class CacheEntry:
+    __slots__ = (
+        "response",
+        "usage",
+        "expires_at",
+        "system_key",
+        "signature",
+        "numbers",
+        "bands",
+        "personalized",
+    )
+
+    def __init__(
+        self,
+        response,
+        usage,
+        expires_at,
+        system_key,
+        signature,
+        numbers,
+        bands,
+        personalized,
+    ):
+        self.response = response
+        self.usage = usage
+        self.expires_at = expires_at
+        self.system_key = system_key
+        self.signature = signature
+        self.numbers = numbers
+        self.bands = bands
+        # 응답 속 사용자명을 USER_PLACEHOLDER로 바꿔 저장했는지 여부
+        self.personalized = personalized
+
+
+class PromptCache:
+    """정규화 프롬프트 캐시 (정확 일치 + 단일 질문 유사 일치)"""
+
+    def __init__(
+        self,
+        ttl: float = PROMPT_CACHE_TTL,
+        max_entries: int = PROMPT_CACHE_MAX_ENTRIES,
+        similarity: float = PROMPT_CACHE_SIMILARITY,
+        enabled: bool = PROMPT_CACHE_ENABLED,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.enabled = enabled
+
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # LSH 밴드 -> 해당 밴드 값을 가진 항목 키 집합
+        self._bands: Dict[Tuple, set] = {}
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(canonical: List[Tuple[str, str]]) -> str:
+        raw = json.dumps(canonical, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _single_turn(canonical: List[Tuple[str, str]]):
+        """system + user 한 개로 된 단일 질문이면 (system 키, 질문) 반환"""
+        system = [c for r, c in canonical if r == "system"]
+        others = [(r, c) for r, c in canonical if r != "system"]
+        if len(system) > 1 or len(others) != 1 or others[0][0] != "user":
+            return None
+        question = others[0][1]
+        if len(question) > MAX_NEAR_DUP_LENGTH:
+            return None
+        return (system[0] if system else ""), question
+
+    def prepare(
+        self,
+        messages: List[Dict],
+        username: str = "",
+        template: Optional[str] = None,
+    ) -> Optional[CacheQuery]:
+        """조회/저장에 쓸 키와 서명 계산 (캐시를 끄면 None)
+
+        template: 서버가 render_template(template, username)으로 만든 system 프롬프트
+        """
+        if not self.enabled:
+            return None
+        canonical, templated = canonicalize(messages, username, template)
+        system_key = signature = numbers = None
+        single = self._single_turn(canonical)
+        if single is not None:
+            system_key, question = single
+            signature = minhash(question)
+            numbers = tuple(_NUMBER.findall(question))
+        return CacheQuery(
+            self._key(canonical),
+            system_key,
+            signature,
+            numbers,
+            username,
+            template if templated else None,
+        )
+
+    @staticmethod
+    def _response_for(entry: CacheEntry, query: CacheQuery) -> str:
+        if entry.personalized:
+            return entry.response.replace(USER_PLACEHOLDER, query.username)
+        return entry.response
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.bands is None:
+            return
+        for band in entry.bands:
+            keys = self._bands.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def _live(self, key: str, now: float) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < now:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, query: Optional[CacheQuery]) -> Optional[Tuple[str, Dict]]:
+        """캐시된 (응답, 원래 usage) 반환, 없으면 None"""
+        if query is None:
+            return None
+        now = time.time()
+
+        entry = self._live(query.key, now)
+        if entry is not None:
+            self.exact_hits += 1
+            return self._response_for(entry, query), entry.usage
+
+        if query.signature is not None:
+            candidates = set()
+            for band in _bands(query.signature):
+                candidates |= self._bands.get(band, set())
+
+            best, best_score = None, self.similarity
+            for key in candidates:
+                candidate = self._live(key, now)
+                if candidate is None or candidate.system_key != query.system_key:
+                    continue
+                # 개수/분량 등 숫자가 다르면 답도 달라지므로 유사 질문으로 보지 않음
+                if candidate.numbers != query.numbers:
+                    continue
+                score = estimate_similarity(query.signature, candidate.signature)
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is not None:
+                self.near_hits += 1
+                return self._response_for(best, query), best.usage
+
+        self.misses += 1
+        return None
+
+    def store(self, query: Optional[CacheQuery], response: str, usage: Dict):
+        """업스트림 응답 저장"""
+        if query is None:
+            return
+
+        personalized = False
+        if query.template is not None and query.username in response:
+            # 템플릿 항목은 여러 사용자가 공유하므로 응답 속 사용자명을 매개변수로 바꿔 저장
+            # 바꾸면 다른 단어까지 바뀔 수 있는 경우는 공유하지 않음
+            if (
+                len(query.username) < MIN_TEMPLATED_NAME_LENGTH
+                or USER_PLACEHOLDER in response
+                or query.username in query.template
+            ):
+                return
+            response = response.replace(query.username, USER_PLACEHOLDER)
+            personalized = True
+
+        self._remove(query.key)
+
+        bands = None
+        if query.signature is not None:
+            bands = _bands(query.signature)
+            for band in bands:
+                self._bands.setdefault(band, set()).add(query.key)
+
+        self._entries[query.key] = CacheEntry(
+            response,
+            usage,
+            time.time() + self.ttl,
+            query.system_key,
+            query.signature,
+            query.numbers,
+            bands,
+            personalized,
+        )
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        avoided = self.exact_hits + self.near_hits
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "upstream_calls_avoided": avoided,
+            "hit_rate": round(avoided / lookups, 4) if lookups else 0,
+        }
@@ -0,0 +1,141 @@
+# 기록된 업스트림 트래픽으로 성능 회귀를 검사하는 스크립트
+# 사용 예:
+#   UPSTREAM_MODE=record python main.py          # 운영 트래픽 기록
+#   python replay_bench.py --speed 10 --p95-ms 500 --max-alloc-kb 20000
+# p95 지연시간이나 메모리 할당량이 기준을 넘으면 종료 코드 1을 반환 (CI용)
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="업스트림 트래픽 재생 성능 회귀 테스트")
+    parser.add_argument("--file", default="upstream_traffic.jsonl", help="기록 파일")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="재생 속도 배율 (0 = 지연 없음)"
+    )
+    parser.add_argument("--p95-ms", type=float, default=None, help="p95 지연시간 기준")
+    parser.add_argument(
+        "--max-alloc-kb", type=float, default=None, help="최대 메모리 할당량 기준"
+    )
+    return parser.parse_args()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_call(record: Dict):
+    """기록 한 건을 서버 엔드포인트 호출로 변환"""
+    messages = json.loads(record["request_body"])
+    tag = record.get("tag", {})
+
+    if tag.get("endpoint") == "role_based_chat":
+        message = messages[-1]["content"] if messages else ""
+        return "/chat/role", {"params": {"role": tag.get("role", ""), "message": message}}
+
+    # system 메시지까지 그대로 보내야 업스트림 요청이 기록과 일치함
+    return "/chat/conversation", {"json": {"messages": messages}}
+
+
+async def run(records: List[Dict], speed: float) -> Dict:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    # 서버와 같은 시작/종료 과정을 거쳐 write-behind 큐까지 비운 뒤 종료
+    async with main.lifespan(main.app), httpx.AsyncClient(
+        transport=transport, base_url="http://testserver"
+    ) as client:
+        await client.post("/user", json={"username": "bench", "password": "bench"})
+        await client.post("/user/login", json={"username": "bench", "password": "bench"})
+
+        latencies: List[float] = []
+        errors = 0
+        first = records[0].get("started_at", 0)
+        base = time.perf_counter()
+
+        async def replay_one(record: Dict):
+            nonlocal errors
+            # 원래 요청 간격(도착 시간)을 속도 배율에 맞춰 재현
+            offset = record.get("started_at", first) - first
+            if speed > 0:
+                delay = offset / speed - (time.perf_counter() - base)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            path, kwargs = build_call(record)
+            start = time.perf_counter()
+            response = await client.post(path, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+        tracemalloc.start()
+        await asyncio.gather(*(replay_one(r) for r in records))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "requests": len(records),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "max_ms": max(latencies) if latencies else 0.0,
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def main():
+    args = parse_args()
+
+    # traffic 모듈이 임포트되기 전에 재생 모드로 설정
+    os.environ["UPSTREAM_MODE"] = "replay"
+    os.environ["UPSTREAM_TRAFFIC_FILE"] = args.file
+    os.environ["UPSTREAM_REPLAY_SPEED"] = str(args.speed)
+    # 캐시 적중이 아니라 기록된 업스트림 지연시간을 그대로 측정
+    os.environ["PROMPT_CACHE_ENABLED"] = "0"
+    # 채팅 기록/사용량 DB는 현재 디렉터리가 아니라 임시 디렉터리에 생성
+    tmp = tempfile.mkdtemp(prefix="replay_bench_")
+    os.environ["CHAT_DB_PATH"] = os.path.join(tmp, "chat_history.db")
+    os.environ["CHAT_JOURNAL_PATH"] = os.path.join(tmp, "chat_history.journal")
+    os.environ["ANALYTICS_DB_PATH"] = os.path.join(tmp, "analytics.db")
+
+    from traffic import load_records
+
+    records = load_records(args.file)
+    if not records:
+        print("❌ 재생할 기록이 없습니다.")
+        return 1
+    records.sort(key=lambda r: r.get("started_at", 0))
+
+    result = asyncio.run(run(records, args.speed))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    failed = False
+    if args.p95_ms is not None and result["p95_ms"] > args.p95_ms:
+        print(f"❌ p95 지연시간 회귀: {result['p95_ms']:.1f}ms > {args.p95_ms}ms")
+        failed = True
+    if args.max_alloc_kb is not None and result["peak_alloc_kb"] > args.max_alloc_kb:
+        print(
+            f"❌ 메모리 할당 회귀: {result['peak_alloc_kb']:.1f}KB > {args.max_alloc_kb}KB"
+        )
+        failed = True
+
+    if not failed:
+        print("✅ 성능 기준 통과")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
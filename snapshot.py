@@ -0,0 +1,64 @@
+# 읽기 전용 엔드포인트용 직렬화 스냅샷 캐시와 조건부 GET(ETag / If-None-Match) 처리
+# 데이터가 바뀔 때만 버전을 올리고, 같은 버전이면 이미 직렬화된 응답 본문을 재사용합니다
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def make_etag(*parts: Any) -> str:
+    """버전 정보로 ETag 생성 (본문을 직렬화하지 않고 계산)"""
+    raw = "|".join(str(part) for part in parts).encode("utf-8")
+    return '"' + hashlib.sha1(raw).hexdigest()[:20] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 헤더에 현재 ETag가 포함되어 있는지 확인"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # 약한 비교: W/ 접두사는 무시
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class SnapshotCache:
+    """ETag -> 직렬화된 JSON 본문 (최근 사용 순으로 최대 maxsize개 유지)"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, etag: str, build: Callable[[], Any]) -> bytes:
+        body = self._items.get(etag)
+        if body is not None:
+            self.hits += 1
+            self._items.move_to_end(etag)
+            return body
+
+        self.misses += 1
+        body = json.dumps(
+            jsonable_encoder(build()), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        self._items[etag] = body
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return body
+
+
+def conditional_json(
+    request: Request, cache: SnapshotCache, etag: str, build: Callable[[], Any]
+) -> Response:
+    """변경이 없으면 304, 있으면 캐시된(또는 새로 만든) 스냅샷을 반환"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = cache.get_or_build(etag, build)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,109 @@
+import asyncio
+import sqlite3
+
+from analytics import UsageAnalytics
+
+USAGE = {"prompt_tokens": 2, "completion_tokens": 3, "total_tokens": 5}
+
+
+def make_analytics(tmp_path, **kwargs):
+    kwargs.setdefault("rollup_interval", 3600)
+    return UsageAnalytics(str(tmp_path / "analytics.db"), **kwargs)
+
+
+def rollup_rows(tmp_path, dimension="user"):
+    with sqlite3.connect(tmp_path / "analytics.db") as conn:
+        return conn.execute(
+            "SELECT key, SUM(requests), SUM(total_tokens), MAX(latency_max_ms)"
+            " FROM usage_rollup WHERE dimension = ? GROUP BY key ORDER BY key",
+            (dimension,),
+        ).fetchall()
+
+
+def test_repeated_rollups_add_only_new_events(tmp_path):
+    analytics = make_analytics(tmp_path)
+
+    async def run():
+        analytics.record("alice", "시인", 0.1, USAGE)
+        await analytics.rollup()
+        # 변경이 없으면 다시 저장해도 값이 늘지 않음
+        await analytics.rollup()
+        analytics.record("alice", "시인", 0.3, USAGE)
+        await analytics.close()
+
+    asyncio.run(run())
+    assert rollup_rows(tmp_path) == [("alice", 2, 10, 300.0)]
+    assert rollup_rows(tmp_path, "role") == [("시인", 2, 10, 300.0)]
+
+
+def test_workers_sharing_db_do_not_overwrite(tmp_path):
+    workers = [make_analytics(tmp_path) for _ in range(2)]
+
+    async def run():
+        for count, analytics in zip((3, 5), workers):
+            for _ in range(count):
+                analytics.record("alice", "conversation", 0.1, USAGE)
+        for analytics in workers:
+            await analytics.rollup()
+        workers[0].record("alice", "conversation", 0.1, USAGE)
+        for analytics in workers:
+            await analytics.close()
+
+    asyncio.run(run())
+    assert rollup_rows(tmp_path) == [("alice", 9, 45, 100.0)]
+
+
+def test_restart_does_not_double_count(tmp_path):
+    async def session(events):
+        analytics = make_analytics(tmp_path)
+        analytics.start()
+        for _ in range(events):
+            analytics.record("bob", "conversation", 0.1, USAGE)
+        result = await analytics.query(window_hours=1)
+        await analytics.close()
+        return result
+
+    asyncio.run(session(2))
+    # 재시작 후 복원된 합계는 조회에는 쓰이지만 다시 저장되지는 않음
+    result = asyncio.run(session(1))
+    assert result["totals"]["requests"] == 3
+    assert rollup_rows(tmp_path) == [("bob", 3, 15, 100.0)]
+
+
+def test_evicted_bucket_is_saved(tmp_path):
+    analytics = make_analytics(tmp_path, bucket_seconds=10, num_buckets=2)
+    event = {"requests": 1, "errors": 0, "latency_sum_ms": 1, "latency_max_ms": 1}
+    event.update(dict.fromkeys(USAGE, 0))
+
+    async def run():
+        analytics.start()
+        analytics._bucket_for(1000).add("user", "carol", event)
+        # 같은 칸을 쓰는 새 구간이 오면 저장하지 않은 이전 버킷이 밀려남
+        analytics._bucket_for(1020)
+        await analytics.close()
+
+    asyncio.run(run())
+    with sqlite3.connect(tmp_path / "analytics.db") as conn:
+        rows = conn.execute(
+            "SELECT bucket_start, key, requests FROM usage_rollup"
+        ).fetchall()
+    assert rows == [(1000, "carol", 1)]
+
+
+def test_failed_rollup_keeps_pending(tmp_path):
+    analytics = make_analytics(tmp_path)
+
+    async def run():
+        analytics.record("dave", "conversation", 0.1, USAGE)
+        write_rows = analytics._write_rows
+
+        def broken(rows):
+            raise sqlite3.OperationalError("database is locked")
+
+        analytics._write_rows = broken
+        await analytics._safe_rollup()
+        analytics._write_rows = write_rows
+        await analytics.close()
+
+    asyncio.run(run())
+    assert rollup_rows(tmp_path) == [("dave", 1, 5, 100.0)]
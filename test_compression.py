@@ -0,0 +1,37 @@
+import gzip
+
+import pytest
+
+from compression import _decompress, gzip_json_body
+
+BODY = b'{"messages": []}' * 100
+
+
+def test_roundtrip():
+    assert _decompress(gzip.compress(BODY), 10_000) == (BODY, 200)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not gzip",
+        gzip.compress(BODY)[:-10],
+        gzip.compress(BODY) + gzip.compress(BODY),
+        gzip.compress(BODY) + b"x",
+    ],
+    ids=["garbage", "truncated", "two-members", "trailing-data"],
+)
+def test_corrupt_body(body):
+    assert _decompress(body, 10_000) == (None, 400)
+
+
+def test_too_large():
+    assert _decompress(gzip.compress(BODY), len(BODY) - 1) == (None, 413)
+
+
+def test_gzip_json_body_threshold():
+    small, headers = gzip_json_body({"a": 1})
+    assert "Content-Encoding" not in headers
+    large, headers = gzip_json_body({"a": "x" * 2000})
+    assert headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(large).startswith(b'{"a"')
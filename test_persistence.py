@@ -0,0 +1,123 @@
+import asyncio
+import sqlite3
+
+from persistence import TurnWriter
+
+TURN = {"timestamp": "2024-01-01T00:00:00", "user_message": "q", "ai_response": "a"}
+
+
+def make_writer(tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 0.01)
+    return TurnWriter(
+        str(tmp_path / "chat.db"), str(tmp_path / "chat.journal"), **kwargs
+    )
+
+
+def count_rows(tmp_path):
+    with sqlite3.connect(tmp_path / "chat.db") as conn:
+        return conn.execute("SELECT COUNT(*) FROM chat_turns").fetchone()[0]
+
+
+def journal_lines(tmp_path):
+    with open(tmp_path / "chat.journal", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+async def wait_until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "시간 초과"
+        await asyncio.sleep(0.005)
+
+
+def test_close_flushes_everything(tmp_path):
+    writer = make_writer(tmp_path, batch_size=3)
+
+    async def run():
+        for _ in range(7):
+            writer.submit("alice", TURN, {"total_tokens": 1})
+        await writer.close()
+
+    asyncio.run(run())
+    assert count_rows(tmp_path) == 7
+    assert journal_lines(tmp_path) == 0
+
+
+def test_recover_after_crash(tmp_path):
+    # 기록 전에 이벤트 루프가 끝나고 close()도 호출되지 않은 상황
+    crashed = make_writer(tmp_path, flush_interval=60)
+
+    async def submit_only():
+        for _ in range(5):
+            crashed.submit("alice", TURN)
+
+    asyncio.run(submit_only())
+    assert journal_lines(tmp_path) == 5
+
+    restarted = make_writer(tmp_path)
+
+    async def restart():
+        restarted.start()
+        await restarted.close()
+
+    asyncio.run(restart())
+    assert restarted.recovered_total == 5
+    assert count_rows(tmp_path) == 5
+    assert journal_lines(tmp_path) == 0
+
+
+def test_failed_flush_keeps_journal(tmp_path):
+    writer = make_writer(tmp_path)
+    write_batch = writer._write_batch
+    failures = {"left": 2}
+
+    def flaky(batch):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        write_batch(batch)
+
+    writer._write_batch = flaky
+
+    async def run():
+        for _ in range(4):
+            writer.submit("alice", TURN)
+        await wait_until(lambda: writer.failed_flushes >= 1)
+        # 기록에 실패한 동안 행은 저널에 그대로 남아 있어야 함
+        assert journal_lines(tmp_path) == 4
+        await wait_until(lambda: writer.flushed_total == 4)
+
+    asyncio.run(run())
+    assert writer.failed_flushes == 2
+    assert writer.flushed_total == 4
+    assert journal_lines(tmp_path) == 0
+
+    asyncio.run(writer.close())
+    assert count_rows(tmp_path) == 4
+
+
+def test_close_with_failing_db_leaves_rows_for_recovery(tmp_path):
+    writer = make_writer(tmp_path)
+
+    def broken(batch):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    writer._write_batch = broken
+
+    async def run():
+        for _ in range(3):
+            writer.submit("alice", TURN)
+        await writer.close()
+
+    asyncio.run(run())
+    assert journal_lines(tmp_path) == 3
+
+    restarted = make_writer(tmp_path)
+
+    async def restart():
+        restarted.start()
+        await restarted.close()
+
+    asyncio.run(restart())
+    assert count_rows(tmp_path) == 3
@@ -0,0 +1,86 @@
+from prompt_cache import PromptCache, USER_PLACEHOLDER, render_template
+
+TEMPLATE = f"You are a helpful assistant for {USER_PLACEHOLDER}."
+
+
+def conversation(username, question):
+    return [
+        {"role": "system", "content": render_template(TEMPLATE, username)},
+        {"role": "user", "content": question},
+    ]
+
+
+def prepare(cache, username, question, template=TEMPLATE):
+    return cache.prepare(conversation(username, question), username, template)
+
+
+def test_template_entry_shared_and_personalized():
+    cache = PromptCache(enabled=True)
+    cache.store(
+        prepare(cache, "alice", "인사해 주세요"),
+        "안녕하세요 alice님!",
+        {"total_tokens": 5},
+    )
+
+    response, usage = cache.lookup(prepare(cache, "bob", "인사해 주세요"))
+    assert response == "안녕하세요 bob님!"
+    assert usage == {"total_tokens": 5}
+    assert (
+        cache.lookup(prepare(cache, "alice", "인사해 주세요"))[0]
+        == "안녕하세요 alice님!"
+    )
+
+
+def test_ambiguous_username_not_shared():
+    cache = PromptCache(enabled=True)
+    # 짧은 사용자명은 다른 단어 안에도 나타날 수 있어 치환하지 않음
+    cache.store(prepare(cache, "al", "인사해 주세요"), "hello al, all good", {})
+    # 응답에 이미 자리 표시자가 있으면 채울 때 구분할 수 없음
+    cache.store(
+        prepare(cache, "alice", "포맷 문자열 예제"), f"alice: '{USER_PLACEHOLDER}'", {}
+    )
+
+    assert cache.lookup(prepare(cache, "bob", "인사해 주세요")) is None
+    assert cache.lookup(prepare(cache, "bob", "포맷 문자열 예제")) is None
+
+
+def test_custom_system_prompt_keyed_per_user():
+    cache = PromptCache(enabled=True)
+    # 템플릿 없이 보낸 system 프롬프트는 사용자명까지 그대로 키에 포함
+    cache.store(prepare(cache, "alice", "인사해 주세요", template=None), "hi alice", {})
+
+    assert cache.lookup(prepare(cache, "bob", "인사해 주세요", template=None)) is None
+    assert (
+        cache.lookup(prepare(cache, "alice", "인사해 주세요", template=None))[0]
+        == "hi alice"
+    )
+
+
+def test_role_template_does_not_collide_across_roles():
+    cache = PromptCache(enabled=True)
+
+    def role_query(role, username):
+        template = (
+            f"assistant는 {role}이다. 사용자 {USER_PLACEHOLDER}에게 도움을 제공한다."
+        )
+        messages = [
+            {"role": "system", "content": render_template(template, username)},
+            {"role": "user", "content": "자기소개"},
+        ]
+        return cache.prepare(messages, username, template)
+
+    # 역할 이름과 사용자명이 같아도 역할이 다른 항목과 섞이지 않음
+    cache.store(role_query("bob", "bob"), "나는 bob 역할", {})
+    assert cache.lookup(role_query("alice", "alice")) is None
+    assert cache.lookup(role_query("bob", "carol")) is None
+
+
+def test_near_duplicate_requires_same_numbers():
+    cache = PromptCache(enabled=True, similarity=0.5)
+    question = "파이썬 데코레이터를 정확히 100단어로 설명해 주세요"
+    cache.store(prepare(cache, "alice", question), "설명", {})
+
+    assert cache.lookup(prepare(cache, "bob", question.replace("100", "200"))) is None
+    hit = cache.lookup(prepare(cache, "bob", question.replace("주세요", "주세요!")))
+    assert hit is not None
+    assert cache.near_hits == 1
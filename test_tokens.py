@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from tokens import issue_token, revoke_token, revoked_tokens, verify_token
+
+
+def test_issue_and_verify():
+    claims = verify_token(issue_token("alice"))
+    assert claims["username"] == "alice"
+    assert claims["expires_at"] > time.time()
+
+
+def test_username_with_separator():
+    assert verify_token(issue_token("a|b"))["username"] == "a|b"
+
+
+def test_expired_token():
+    assert verify_token(issue_token("alice", ttl=-1)) is None
+
+
+def test_tampered_signature():
+    payload, _, signature = issue_token("alice").partition(".")
+    forged = signature[:-1] + ("A" if signature[-1] != "A" else "B")
+    assert verify_token(f"{payload}.{forged}") is None
+
+
+def test_revoked_token():
+    token = issue_token("alice")
+    revoke_token(verify_token(token))
+    try:
+        assert verify_token(token) is None
+    finally:
+        revoked_tokens.clear()
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        ".",
+        "abc",
+        "abc.",
+        ".abc",
+        "\xe9.abc",
+        "abc.\xe9",
+        "not base64!.abc",
+        "abc.def.ghi",
+    ],
+)
+def test_malformed_token(token):
+    assert verify_token(token) is None
@@ -0,0 +1,75 @@
+# 서명된 액세스 토큰 (세션 쿠키 없이 HMAC 한 번으로 인증)
+# 토큰 형식: base64url(사용자명|발급시각|만료시각|토큰ID) + "." + base64url(HMAC-SHA256 서명)
+# 로그아웃한 토큰은 만료될 때까지 서버의 폐기 목록에 보관합니다
+import base64
+import hashlib
+import hmac
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+TOKEN_SECRET = os.environ.get("TOKEN_SECRET", "your_secret_key").encode("utf-8")
+# 토큰 유효 시간 (초)
+TOKEN_TTL = int(os.environ.get("TOKEN_TTL", str(12 * 60 * 60)))
+
+# 폐기된 토큰 ID -> 만료 시각
+revoked_tokens: Dict[str, float] = {}
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(TOKEN_SECRET, payload.encode("ascii"), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def issue_token(username: str, ttl: int = TOKEN_TTL) -> str:
+    """사용자 액세스 토큰 발급"""
+    now = int(time.time())
+    claims = f"{username}|{now}|{now + ttl}|{uuid.uuid4().hex}"
+    payload = _b64encode(claims.encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> Optional[Dict]:
+    """서명, 만료, 폐기 여부 확인 후 토큰 정보 반환 (유효하지 않으면 None)"""
+    payload, _, signature = token.partition(".")
+    if not payload or not signature:
+        return None
+    # 헤더/쿠키 값은 임의 문자열이므로 서명 계산 전에 ASCII가 아니면 거절
+    if not token.isascii():
+        return None
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+
+    try:
+        username, issued_at, expires_at, token_id = (
+            _b64decode(payload).decode("utf-8").rsplit("|", 3)
+        )
+        issued_at, expires_at = int(issued_at), int(expires_at)
+    except ValueError:
+        return None
+
+    if expires_at < time.time() or token_id in revoked_tokens:
+        return None
+    return {
+        "username": username,
+        "issued_at": issued_at,
+        "expires_at": expires_at,
+        "token_id": token_id,
+    }
+
+
+def revoke_token(claims: Dict):
+    """토큰 폐기 (만료된 폐기 항목은 이때 함께 정리)"""
+    now = time.time()
+    for token_id in [k for k, exp in revoked_tokens.items() if exp < now]:
+        del revoked_tokens[token_id]
+    revoked_tokens[claims["token_id"]] = claims["expires_at"]
@@ -0,0 +1,226 @@
+# 업스트림(부트캠프 API) 트래픽 기록/재생 모듈
+# UPSTREAM_MODE 환경변수로 동작 방식을 선택합니다
+#   - live   : 실제 API 호출 (기본값)
+#   - record : 실제 API 호출 + 요청/응답/지연시간을 JSONL 파일에 기록
+#   - replay : 기록된 JSONL 파일에서 응답을 원래 지연시간대로 재생 (네트워크 미사용)
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import httpx
+
+UPSTREAM_MODE = os.environ.get("UPSTREAM_MODE", "live")
+# 기록 파일 경로 (한 줄에 요청/응답 한 쌍)
+TRAFFIC_FILE = os.environ.get("UPSTREAM_TRAFFIC_FILE", "upstream_traffic.jsonl")
+# 재생 속도 배율 (1.0 = 실시간, 10.0 = 10배 가속, 0 = 지연 없음)
+REPLAY_SPEED = float(os.environ.get("UPSTREAM_REPLAY_SPEED", "1.0"))
+
+# 재생 시 다시 붙이면 안 되는 헤더 (본문은 이미 디코딩된 상태로 저장됨)
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def request_key(method: str, url: str, body: bytes) -> str:
+    """요청을 식별하는 키 (메서드 + URL + 본문 해시)"""
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode("utf-8"))
+    digest.update(b" ")
+    digest.update(url.encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def load_records(path: str) -> List[Dict]:
+    """JSONL 기록 파일 읽기 (빈 줄은 무시)"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """실제 전송 계층을 감싸서 모든 요청/응답 쌍을 JSONL 파일에 추가 기록"""
+
+    def __init__(self, path: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.path = path
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self._file = None
+        # 파일 쓰기는 전용 스레드 하나에서 순서대로 처리 (측정 중인 응답 경로를 막지 않음)
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+    def _write_line(self, line: str):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(line + "\n")
+        self._file.flush()
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        self._writer.submit(self._write_line, line)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = request.content
+        record = {
+            "key": request_key(request.method, str(request.url), body),
+            "started_at": time.time(),
+            "tag": request.extensions.get("traffic_tag", {}),
+            "method": request.method,
+            "url": str(request.url),
+            "request_body": body.decode("utf-8", errors="replace"),
+        }
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+            content = await response.aread()
+        except httpx.TransportError as e:
+            # 타임아웃/연결 실패 등도 트래픽 형태의 일부이므로 기록
+            record["latency_ms"] = (time.perf_counter() - start) * 1000
+            record["error"] = (
+                "timeout" if isinstance(e, httpx.TimeoutException) else "transport"
+            )
+            record["error_type"] = type(e).__name__
+            self._write(record)
+            raise
+
+        record["latency_ms"] = (time.perf_counter() - start) * 1000
+        headers = {
+            k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS
+        }
+        record["status_code"] = response.status_code
+        record["response_headers"] = headers
+        record["response_body"] = content.decode("utf-8", errors="replace")
+        self._write(record)
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+        )
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def aclose(self):
+        await self.transport.aclose()
+        # 남은 기록을 모두 쓴 뒤 파일 닫기
+        self._writer.submit(self._close_file)
+        await asyncio.to_thread(self._writer.shutdown)
+
+
+def _replay_error(record: Dict):
+    """기록된 오류를 같은 종류의 httpx 예외 클래스로 변환"""
+    error_cls = getattr(httpx, record.get("error_type", ""), None)
+    if isinstance(error_cls, type) and issubclass(error_cls, httpx.TransportError):
+        return error_cls
+    return httpx.ReadTimeout if record["error"] == "timeout" else httpx.ConnectError
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """기록된 응답을 원래 지연시간(속도 배율 적용)으로 돌려주는 로컬 대역"""
+
+    def __init__(self, records: List[Dict], speed: float = 1.0):
+        self.records = records
+        self.speed = speed
+        self._by_key: Dict[str, List[Dict]] = {}
+        for record in records:
+            self._by_key.setdefault(record["key"], []).append(record)
+        self._key_pos: Dict[str, int] = {}
+        self._pos = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path: str, speed: float = 1.0) -> "ReplayTransport":
+        return cls(load_records(path), speed=speed)
+
+    def _next_record(self, key: str) -> Dict:
+        # 같은 요청이 기록돼 있으면 그 응답을 순서대로 사용
+        matches = self._by_key.get(key)
+        if matches:
+            self.hits += 1
+            pos = self._key_pos.get(key, 0)
+            self._key_pos[key] = pos + 1
+            return matches[pos % len(matches)]
+
+        # 없으면 기록 순서대로 돌려가며 사용 (트래픽 형태만 재현)
+        self.misses += 1
+        record = self.records[self._pos % len(self.records)]
+        self._pos += 1
+        return record
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.records:
+            raise httpx.ConnectError("재생할 기록이 없습니다", request=request)
+
+        key = request_key(request.method, str(request.url), request.content)
+        record = self._next_record(key)
+
+        if self.speed > 0:
+            await asyncio.sleep(record.get("latency_ms", 0) / 1000 / self.speed)
+
+        if record.get("error"):
+            raise _replay_error(record)("기록된 전송 오류 재생", request=request)
+
+        return httpx.Response(
+            status_code=record["status_code"],
+            headers=record.get("response_headers", {}),
+            content=record["response_body"].encode("utf-8"),
+            request=request,
+        )
+
+    async def aclose(self):
+        # 여러 클라이언트가 공유하므로 닫지 않음
+        pass
+
+
+_replay_transport: Optional[ReplayTransport] = None
+
+
+def get_upstream_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """UPSTREAM_MODE에 맞는 전송 계층 반환 (live 모드는 None = httpx 기본값)"""
+    global _replay_transport
+
+    if UPSTREAM_MODE == "record":
+        return RecordingTransport(TRAFFIC_FILE)
+    if UPSTREAM_MODE == "replay":
+        if _replay_transport is None:
+            _replay_transport = ReplayTransport.from_file(TRAFFIC_FILE, REPLAY_SPEED)
+        return _replay_transport
+    return None
+
+
+# 라우터에서 httpx를 직접 임포트하지 않고 이 모듈을 통해 업스트림 오류를 처리
+UpstreamTimeout = httpx.TimeoutException
+UpstreamStatusError = httpx.HTTPStatusError
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """업스트림 호출용 공유 클라이언트 (요청 간 연결 재사용, 실행 중인 루프마다 하나)"""
+    global _http_client, _http_client_loop
+
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(transport=get_upstream_transport())
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client, _http_client_loop
+
+    if _http_client is not None and _http_client_loop is asyncio.get_running_loop():
+        await _http_client.aclose()
+    _http_client = _http_client_loop = None